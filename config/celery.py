@@ -18,3 +18,6 @@ app.config_from_object(f'django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Метрики задач: сигналы нужны и воркеру, и процессам, которые публикуют задачи
+import config.task_metrics  # noqa: E402, F401
+
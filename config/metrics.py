@@ -0,0 +1,182 @@
+"""Метрики запросов в формате Prometheus.
+
+RequestMetricsMiddleware считает для каждого запроса число SQL запросов и
+время в базе, в сериализации и во внешних API, отдает их заголовком
+Server-Timing и копит гистограммы по имени view для /metrics.
+Для потоковых ответов (выгрузки) учитывается только время до начала отдачи.
+"""
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from prometheus_client import multiprocess
+from rest_framework.renderers import JSONRenderer
+
+DURATION_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ('view', 'method', 'status'), buckets=DURATION_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Число SQL запросов за запрос', ('view',), buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Время SQL запросов за запрос', ('view',), buckets=DURATION_BUCKETS,
+)
+REQUEST_SERIALIZE_DURATION = Histogram(
+    'http_request_serialize_duration_seconds', 'Время сериализации и рендеринга ответа',
+    ('view',), buckets=DURATION_BUCKETS,
+)
+REQUEST_EXTERNAL_DURATION = Histogram(
+    'http_request_external_duration_seconds', 'Время запросов к внешним API за запрос',
+    ('view',), buckets=DURATION_BUCKETS,
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    'external_call_duration_seconds', 'Время одного запроса к внешнему API (Stripe, currencyapi)',
+    ('host',), buckets=DURATION_BUCKETS,
+)
+
+
+class RequestTimings:
+    """Счетчики текущего запроса; время в секундах"""
+    __slots__ = ('db_queries', 'db', 'serialize', 'external', 'serializing')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.external = 0.0
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """execute_wrapper для всех подключений к базе."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.db_queries += 1
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{self.db_queries} queries", '
+            f'serialize;dur={self.serialize * 1000:.1f}, '
+            f'external;dur={self.external * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+
+current_timings = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def serializing():
+    """Считает время сериализации; вложенные сериализаторы не учитываются повторно.
+
+    SQL запросы, сделанные во время сериализации, попадают и в db.
+    """
+    timings = current_timings.get()
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize += time.perf_counter() - started
+        timings.serializing = False
+
+
+class TimedSerializerMixin:
+    """Добавляет время to_representation в метрики запроса"""
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, время рендеринга которого идет в метрику сериализации"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serializing():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedSession(requests.Session):
+    """Сессия requests, которая считает время запросов к внешним API (вместе с чтением тела)"""
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            EXTERNAL_CALL_DURATION.labels(urlsplit(request.url).hostname).observe(elapsed)
+            timings = current_timings.get()
+            if timings is not None:
+                timings.external += elapsed
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики запроса; ставится первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timings.record_query))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total)
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        REQUEST_DURATION.labels(view, request.method, response.status_code).observe(total)
+        REQUEST_DB_QUERIES.labels(view).observe(timings.db_queries)
+        REQUEST_DB_DURATION.labels(view).observe(timings.db)
+        REQUEST_SERIALIZE_DURATION.labels(view).observe(timings.serialize)
+        REQUEST_EXTERNAL_DURATION.labels(view).observe(timings.external)
+        return response
+
+
+def get_registry():
+    """При нескольких процессах (gunicorn) метрики собираются из PROMETHEUS_MULTIPROC_DIR."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Метрики для Prometheus, нужен заголовок Authorization: Bearer METRICS_TOKEN.
+
+    Без METRICS_TOKEN метрики отдаются только при DEBUG: иначе любой увидел бы
+    трафик, задержки и число запросов по каждому view.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,113 @@
+"""Чтение с реплик, запись в default.
+
+ReplicaRoutingMiddleware разрешает репликам обслуживать чтение только в
+безопасных запросах (GET, HEAD, OPTIONS). После успешной записи
+аутентифицированный клиент на REPLICA_PIN_SECONDS остается на default,
+чтобы видеть свои изменения, пока реплики догоняют. Celery задачи, команды
+и транзакции читают из default.
+"""
+import random
+from contextvars import ContextVar
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.settings import api_settings
+
+PRIMARY_PIN_KEY = 'db-primary-pin:{}'
+
+
+def get_client_key(request):
+    """Id пользователя из JWT или сессия (админка); None для анонимных запросов.
+
+    Подпись токена здесь не проверяется: ключ влияет только на выбор базы,
+    а сам токен проверит аутентификация DRF. Закрепление за default ставится
+    только по проверенному пользователю (get_pin_keys).
+    """
+    auth_type, _, token = request.headers.get('Authorization', '').partition(' ')
+    if auth_type in api_settings.AUTH_HEADER_TYPES and token:
+        try:
+            user_id = jwt.decode(token, options={'verify_signature': False}).get(api_settings.USER_ID_CLAIM)
+        except jwt.InvalidTokenError:
+            return None
+        return f'user:{user_id}' if user_id is not None else None
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    return f'session:{session_key}' if session_key else None
+
+
+def get_pin_keys(request, response):
+    """Ключи клиента после записи: только для успешного ответа и
+    пользователя, которого проверила аутентификация (DRF или сессия)."""
+    user = getattr(request, 'user', None)
+    if response.status_code >= 400 or not getattr(user, 'is_authenticated', False):
+        return []
+    keys = [f'user:{user.pk}']
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        keys.append(f'session:{session_key}')
+    return keys
+
+
+def pin_to_primary(client_keys):
+    cache.set_many({PRIMARY_PIN_KEY.format(key): True for key in client_keys}, settings.REPLICA_PIN_SECONDS)
+
+
+class ReadRouting:
+    """База для чтения в одном безопасном запросе; выбирается при первом чтении"""
+
+    def __init__(self, client_key):
+        self.client_key = client_key
+        self.alias = None
+
+    def get_alias(self):
+        if self.alias is None:
+            pinned = self.client_key and cache.get(PRIMARY_PIN_KEY.format(self.client_key))
+            self.alias = DEFAULT_DB_ALIAS if pinned else random.choice(settings.DATABASE_REPLICAS)
+        return self.alias
+
+
+read_routing = ContextVar('read_routing', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = read_routing.get()
+        # внутри транзакции читаем то, что в ней записали
+        if routing is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.get_alias()
+
+    def db_for_write(self, model, **hints):
+        routing = read_routing.get()
+        if routing is not None:
+            # после записи в этом же запросе реплика может быть уже устаревшей
+            routing.alias = DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии default
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            client_keys = get_pin_keys(request, response)
+            if client_keys:
+                pin_to_primary(client_keys)
+            return response
+
+        token = read_routing.set(ReadRouting(get_client_key(request)))
+        try:
+            return self.get_response(request)
+        finally:
+            read_routing.reset(token)
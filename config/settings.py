@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django_filters',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'users',
     'lms',
     'drf_yasg',
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.RequestMetricsMiddleware',
+    'config.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,11 +61,15 @@ ROOT_URLCONF = 'config.urls'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 TEMPLATES = [
@@ -98,6 +105,24 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS="host[:port],...", остальные параметры как у default.
+# В тестах реплики смотрят в тестовую базу default (MIRROR), отдельным подключением.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает из default, а не с реплик
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -151,15 +176,90 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Время жизни пользователя в кеше аутентификации (секунды)
+JWT_USER_CACHE_TIMEOUT = 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+if os.getenv('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Кеш общий для всех процессов (веб и Celery). Без него аутентификация не
+# доверяет claims токена и кешу пользователей: деактивацию в воркере
+# процессы веб-сервера не увидят.
+CACHE_SHARED = bool(os.getenv('CACHE_URL'))
+
 STRIPE_API_KEY = os.getenv('STRIPE_API_KEY')
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
 CURRENCY_API_KEY = os.getenv('CURRENCY_API_KEY')
 
+# Время жизни кеша списков курсов и уроков (секунды); сброс - по поколению моделей
+LIST_CACHE_TIMEOUT = 5 * 60
+
+# Внешние API: таймауты (connect, read) и размер пула соединений
+EXTERNAL_API_TIMEOUT = (3, 10)
+HTTP_POOL_MAXSIZE = 10
 
-ELERY_BEAT_SCHEDULE = {
+# Курс валют: провайдер и время жизни в кеше (секунды)
+EXCHANGE_RATE_PROVIDER = 'users.services.CurrencyApiProvider'
+EXCHANGE_RATE_CACHE_TIMEOUT = 2 * 60 * 60
+
+# Создание ссылки на оплату в фоне (Celery) и Retry-After (секунды) в payment/<id>/status, пока она не готова
+PAYMENT_CREATE_ASYNC = True
+PAYMENT_STATUS_RETRY_AFTER = 1
+
+# Максимум уроков в одном запросе lessons/bulk_create/
+LESSON_BULK_CREATE_MAX = 1000
+
+# Количество строк, читаемых из базы и отдаваемых клиенту за раз при выгрузке
+EXPORT_CHUNK_SIZE = 2000
+
+# Размер пачки пользователей в задаче deactivate_inactive_users
+DEACTIVATE_USERS_BATCH_SIZE = 1000
+
+# Размер пачки писем при рассылке об обновлении курса
+COURSE_UPDATE_EMAIL_CHUNK_SIZE = 500
+
+# Уменьшенные копии картинок курсов, уроков и аватаров: имя -> (ширина, высота)
+IMAGE_VARIANT_SIZES = {
+    'thumb': (200, 200),
+    'medium': (800, 800),
+}
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+
+# Заголовок Server-Timing (база, сериализация, внешние API) и токен для /metrics
+# (без токена /metrics доступен только при DEBUG)
+SERVER_TIMING_HEADER = True
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Порт, на котором воркер Celery отдает метрики задач и длину очередей (0 - выключено)
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 9808))
+
+
+CELERY_BEAT_SCHEDULE = {
     'deactivate-inactive-users-every-day': {
         'task': 'lms.tasks.deactivate_inactive_users',
         'schedule': crontab(minute=0, hour=0),
     },
+    'refresh-exchange-rate-every-hour': {
+        'task': 'users.tasks.refresh_exchange_rates',
+        'schedule': crontab(minute=0),
+    },
 }
 
 
@@ -0,0 +1,102 @@
+"""Метрики Celery задач в формате Prometheus.
+
+Сигналы Celery дают время выполнения и исход каждой задачи, а также
+ожидание в очереди от публикации до старта (по заголовку published_at,
+часы веб-сервера и воркера должны быть синхронизированы). Воркер отдает
+метрики и длину очередей брокера на порту WORKER_METRICS_PORT.
+Задачи prefork пула выполняются в дочерних процессах, поэтому для него
+нужен PROMETHEUS_MULTIPROC_DIR.
+"""
+import logging
+import time
+from datetime import datetime
+
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_ready
+from django.conf import settings
+from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_AT_HEADER = 'published_at'
+TASK_BUCKETS = (.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Время выполнения задачи', ('task', 'state'), buckets=TASK_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Ожидание задачи в очереди от публикации (или eta) до старта',
+    ('task',), buckets=TASK_BUCKETS,
+)
+TASKS = Counter('celery_tasks', 'Завершенные задачи по исходу (SUCCESS, FAILURE, RETRY)', ('task', 'state'))
+
+# task_id -> время старта; запись удаляется в task_postrun
+started_at = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    # в протоколе 2 заголовки сообщения попадают в task.request.headers
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    started_at[task_id] = time.perf_counter()
+    published_at = (task.request.headers or {}).get(PUBLISHED_AT_HEADER)
+    if published_at is None:
+        return
+    if task.request.eta:
+        # отложенная задача ждет не с публикации, а с назначенного времени
+        published_at = max(published_at, datetime.fromisoformat(task.request.eta).timestamp())
+    TASK_QUEUE_WAIT.labels(task.name).observe(max(0.0, time.time() - published_at))
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = started_at.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name, state).observe(time.perf_counter() - started)
+    TASKS.labels(task.name, state).inc()
+
+
+class QueueDepthCollector:
+    """Длина очередей брокера; снимается при каждом опросе метрик"""
+
+    def __init__(self, app, queues):
+        self.app = app
+        self.queues = queues
+
+    def collect(self):
+        depth = GaugeMetricFamily('celery_queue_length', 'Сообщений в очереди брокера', labels=('queue',))
+        with self.app.connection_for_read() as connection:
+            try:
+                for queue in self.queues:
+                    depth.add_metric((queue,), self.get_depth(connection, queue))
+            except connection.connection_errors as exc:
+                logger.warning('Не удалось получить длину очередей: %s', exc)
+                return
+        yield depth
+
+    @staticmethod
+    def get_depth(connection, queue):
+        try:
+            with connection.channel() as channel:
+                return channel.queue_declare(queue, passive=True).message_count
+        except connection.channel_errors:
+            # очередь еще не объявлена (или пуста и удалена брокером)
+            return 0
+
+
+@worker_ready.connect
+def start_metrics_server(sender=None, **kwargs):
+    if not settings.WORKER_METRICS_PORT:
+        return
+    # config.metrics импортирует DRF, поэтому только после django.setup()
+    from config.metrics import get_registry
+
+    registry = get_registry()
+    registry.register(QueueDepthCollector(sender.app, list(sender.app.amqp.queues)))
+    start_http_server(settings.WORKER_METRICS_PORT, registry=registry)
+    logger.info('Метрики воркера на порту %s', settings.WORKER_METRICS_PORT)
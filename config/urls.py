@@ -5,6 +5,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from config.metrics import metrics_view
+
 ...
 
 schema_view = get_schema_view(
@@ -24,6 +26,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('lms/', include('lms.urls', namespace="lms")),
     path("users/", include("users.urls", namespace="users")),
+    path('metrics', metrics_view, name='metrics'),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
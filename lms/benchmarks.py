@@ -0,0 +1,250 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from unittest.mock import patch
+
+import stripe
+from django.contrib.auth.models import Group
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from lms.models import Course, Lesson, Subscription
+from lms.paginations import CustomPagination
+from lms.seeding import WORDS
+from users.models import Payment, User
+from users.roles import MODERATOR_GROUP
+from users.serializers import UserTokenObtainPairSerializer, set_user_claims
+from users.services import CurrencyApiProvider
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Локальная замена Stripe и currencyapi: фиксированные ответы без сети"""
+    ids = count(1)
+    responses = {
+        '/v1/products': lambda n: {'id': f'prod_bench_{n}', 'object': 'product'},
+        '/v1/prices': lambda n: {'id': f'price_bench_{n}', 'object': 'price'},
+        '/v1/checkout/sessions': lambda n: {
+            'id': f'cs_bench_{n}', 'object': 'checkout.session', 'url': f'https://checkout.test/cs_bench_{n}',
+        },
+        '/v3/latest': lambda n: {'data': {'RUB': {'code': 'RUB', 'value': 100}}},
+    }
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.respond()
+
+    def respond(self):
+        build = self.responses.get(self.path.split('?')[0])
+        body = json.dumps(build(next(self.ids)) if build else {'error': {'message': 'not found'}}).encode()
+        self.send_response(200 if build else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_external_apis():
+    """Направляет Stripe и currencyapi на локальный HTTP сервер, платежи - синхронно."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        with patch.object(stripe, 'api_base', base_url), patch.object(stripe, 'api_key', 'sk_test_benchmark'), \
+                patch.object(CurrencyApiProvider, 'url', f'{base_url}/v3/latest'), \
+                override_settings(PAYMENT_CREATE_ASYNC=False):
+            yield base_url
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class Scenario:
+    """Один эндпоинт: как построить запрос и что запомнить из ответа"""
+
+    def __init__(self, name, method, build):
+        self.name = name
+        self.method = method
+        self.build = build
+
+    def request(self, client, rng, ids, state):
+        path, data = self.build(rng, ids, state)
+        if self.method == 'get':
+            response = client.get(path)
+        else:
+            response = client.post(path, data, format='json')
+        # списки читаются страница за страницей по ссылке next
+        if isinstance(getattr(response, 'data', None), dict):
+            state[self.name] = response.data.get('next')
+        return response
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        Scenario('course_list', 'get', lambda rng, ids, state: (state.get('course_list') or '/lms/course/', None)),
+        Scenario('course_list_offset', 'get', lambda rng, ids, state: (
+            f'/lms/course/?pagination=offset&page={rng.randint(1, ids["course_pages"])}', None
+        )),
+        Scenario('course_detail', 'get', lambda rng, ids, state: (
+            f'/lms/course/{rng.choice(ids["courses"])}/?lessons_limit=20', None
+        )),
+        Scenario('lesson_list', 'get', lambda rng, ids, state: (state.get('lesson_list') or '/lms/lessons/', None)),
+        Scenario('lesson_search', 'get', lambda rng, ids, state: (f'/lms/lessons/?search={rng.choice(WORDS)}', None)),
+        Scenario('subscription_toggle', 'post', lambda rng, ids, state: (
+            '/lms/subscription/', {'course_id': rng.choice(ids['courses'])}
+        )),
+        Scenario('payment_create', 'post', lambda rng, ids, state: (
+            '/users/payment/create/',
+            {'course': rng.choice(ids['courses']), 'amount': rng.choice((1000, 5000, 10000)), 'payment_method': 'transfer'},
+        )),
+    )
+}
+
+
+def get_benchmark_client():
+    """Клиент с настоящим JWT модератора (модератор видит любые курсы)."""
+    user, _ = User.objects.get_or_create(email=BENCHMARK_EMAIL)
+    group, _ = Group.objects.get_or_create(name=MODERATOR_GROUP)
+    user.groups.add(group)
+    token = set_user_claims(UserTokenObtainPairSerializer.get_token(user).access_token, user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@contextmanager
+def capture_queries():
+    """Запросы ко всем базам за время блока: с репликами чтение идет не в default."""
+    with ExitStack() as stack:
+        yield [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+
+
+def run_worker(scenario, requests, warmup, ids, rng):
+    """Запросы одного потока: (начало, конец, число SQL запросов, код ответа) на запрос."""
+    client = get_benchmark_client()
+    state = {}
+    samples = []
+    try:
+        for i in range(warmup + requests):
+            with capture_queries() as queries:
+                started = time.perf_counter()
+                response = scenario.request(client, rng, ids, state)
+                finished = time.perf_counter()
+            if i >= warmup:
+                samples.append((started, finished, sum(map(len, queries)), response.status_code))
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return samples
+
+
+def run_scenario(scenario, requests, warmup, concurrency, ids, rng):
+    seeds = [rng.random() for _ in range(concurrency)]
+    per_worker = max(1, requests // concurrency)
+    if concurrency == 1:
+        samples = run_worker(scenario, per_worker, warmup, ids, rng)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = executor.map(
+                lambda seed: run_worker(scenario, per_worker, warmup, ids, random.Random(seed)), seeds
+            )
+            samples = [sample for worker_samples in results for sample in worker_samples]
+    # время от первого замеренного запроса до последнего, без прогрева
+    wall = max(finished for _, finished, _, _ in samples) - min(started for started, _, _, _ in samples)
+
+    durations = [(finished - started) * 1000 for started, finished, _, _ in samples]
+    queries = [query_count for _, _, query_count, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(status_code >= 400 for _, _, _, status_code in samples),
+        'p50_ms': round(statistics.median(durations), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'mean_ms': round(statistics.fmean(durations), 3),
+        'max_ms': round(max(durations), 3),
+        'throughput_rps': round(len(samples) / wall, 1),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_dataset():
+    return {
+        'users': User.objects.count(),
+        'courses': Course.objects.count(),
+        'lessons': Lesson.objects.count(),
+        'subscriptions': Subscription.objects.count(),
+        'payments': Payment.objects.count(),
+    }
+
+
+def run_benchmark(names, requests, warmup, concurrency, rng):
+    course_count = Course.objects.count()
+    if not course_count:
+        raise ValueError('В базе нет курсов, сначала заполните ее (--seed)')
+    ids = {
+        'courses': list(Course.objects.order_by('?').values_list('id', flat=True)[:10000]),
+        'course_pages': -(-course_count // CustomPagination.page_size),
+    }
+    dataset = get_dataset()  # до прогона: подписка и оплата меняют данные
+    with stub_external_apis():
+        endpoints = {
+            name: run_scenario(SCENARIOS[name], requests, warmup, concurrency, ids, rng) for name in names
+        }
+    return {
+        'commit': get_commit(),
+        'created_at': now().isoformat(),
+        'database': connection.vendor,
+        'dataset': dataset,
+        'settings': {'requests': requests, 'warmup': warmup, 'concurrency': concurrency},
+        'endpoints': endpoints,
+    }
+
+
+def compare_results(previous, current, metrics=('p50_ms', 'p95_ms', 'queries_per_request')):
+    """Строки сравнения с прошлым прогоном: изменение метрик в процентах."""
+    lines = []
+    for name, result in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        changes = []
+        for metric in metrics:
+            if before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                changes.append(f'{metric} {before[metric]} -> {result[metric]} ({change:+.1f}%)')
+        lines.append(f'{name}: ' + ', '.join(changes))
+    return lines
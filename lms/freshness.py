@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import time
+from functools import partial
+
+from celery import shared_task
+from kombu.exceptions import OperationalError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+LAST_MODIFIED_KEY = 'lms-last-modified:{}'
+GENERATION_KEY = 'lms-generation:{}'
+LIST_CACHE_KEY = 'lms-list:{}:{}'
+
+logger = logging.getLogger(__name__)
+
+
+def touch_models(*models):
+    """Отмечает изменение моделей: время изменения и номер поколения.
+
+    Отметка ставится после коммита текущей транзакции: до коммита
+    параллельный запрос прочитал бы старые строки и закешировал их под
+    новым поколением. Модели копятся в наборе подключения, и вся
+    транзакция отмечается один раз. С репликами отметка повторяется через
+    REPLICA_PIN_SECONDS, когда реплики догонят default, и сбрасывает то,
+    что успели закешировать по отстающей реплике; без брокера повтор
+    только пишется в лог и не ломает уже закоммиченный запрос.
+    """
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'touched_labels'):
+        connection.touched_labels = set()
+    connection.touched_labels.update(model._meta.label_lower for model in models)
+    # callback на каждый вызов: после отката транзакции ее callback'и
+    # пропадают, а набор остается; работу делает первый выполненный
+    transaction.on_commit(partial(flush_touched_labels, connection))
+
+
+def flush_touched_labels(connection):
+    labels = sorted(connection.touched_labels)
+    if not labels:
+        return
+    connection.touched_labels.clear()
+    touch_labels(labels)
+    if settings.DATABASE_REPLICAS:
+        touch_labels_after_replica_lag(labels)
+
+
+def touch_labels_after_replica_lag(labels):
+    try:
+        touch_labels.apply_async((labels,), countdown=settings.REPLICA_PIN_SECONDS)
+    except OperationalError as exc:
+        logger.warning('Не удалось отложить повторную отметку %s: %s', labels, exc)
+
+
+@shared_task
+def touch_labels(labels):
+    """Данные хранятся в общем кеше, поэтому при нескольких процессах нужен
+    CACHE_URL, иначе процессы не увидят изменений друг друга."""
+    now = time.time()
+    cache.set_many({LAST_MODIFIED_KEY.format(label): now for label in labels}, None)
+    for label in labels:
+        key = GENERATION_KEY.format(label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def get_generations(*models):
+    """Номера поколений моделей; пропавший из кеша номер начинается заново
+    со времени в наносекундах, чтобы не совпасть со старыми ключами."""
+    keys = [GENERATION_KEY.format(model._meta.label_lower) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def get_models_last_modified(*models):
+    """Время последнего изменения моделей; неизвестное считается текущим."""
+    keys = [LAST_MODIFIED_KEY.format(model._meta.label_lower) for model in models]
+    values = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in values}
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    return max(values.values())
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для retrieve и list.
+
+    Если клиент прислал If-None-Match или If-Modified-Since и данные не
+    менялись, отвечаем 304 до загрузки объектов и сериализатора.
+    Условный retrieve читает только updated_at (и owner_id для прав) объекта,
+    безусловный берет их из объекта, который загружается для ответа;
+    list - время изменения freshness_models из кеша.
+    """
+    freshness_models = ()
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_conditional(request):
+            instance = self.get_object()
+            return self.get_conditional_response(
+                request, instance.updated_at.timestamp(), lambda: Response(self.get_serializer(instance).data)
+            )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = self.get_object_for_freshness(kwargs[lookup_url_kwarg])
+        self.check_object_permissions(request, obj)
+        last_modified = obj.updated_at.timestamp()
+        return self.get_conditional_response(
+            request, last_modified, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    def list(self, request, *args, **kwargs):
+        last_modified = get_models_last_modified(*self.freshness_models)
+        return self.get_conditional_response(
+            request, last_modified, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    @staticmethod
+    def is_conditional(request):
+        return 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+    def get_object_for_freshness(self, pk):
+        return get_object_or_404(self.queryset.model.objects.only('id', 'owner_id', 'updated_at'), pk=pk)
+
+    def get_etag(self, request, last_modified):
+        # в ответе может быть is_subscribed текущего пользователя и параметры запроса
+        parts = f'{self.__class__.__name__}:{last_modified}:{request.user.pk}:{request.get_full_path()}'
+        return quote_etag(hashlib.sha1(parts.encode()).hexdigest())
+
+    def get_conditional_response(self, request, last_modified, render):
+        etag = self.get_etag(request, last_modified)
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(int(last_modified))
+        return response
+
+
+class CachedListMixin:
+    """Кеш ответа list, ключ - поколения cache_models и полный URL запроса.
+
+    Изменение любой из моделей меняет поколение, поэтому старые ключи
+    просто перестают читаться (без перебора ключей). Поля, зависящие от
+    пользователя (user_fields), не кешируются и заполняются в
+    overlay_user_fields после чтения из кеша.
+    """
+    cache_models = ()
+    user_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        generations = ':'.join(str(generation) for generation in get_generations(*self.cache_models))
+        url_hash = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        key = LIST_CACHE_KEY.format(self.__class__.__name__, f'{generations}:{url_hash}')
+
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, self.strip_user_fields(response.data), settings.LIST_CACHE_TIMEOUT)
+            return response
+
+        self.overlay_user_fields(data['results'] if isinstance(data, dict) else data)
+        return Response(data)
+
+    def strip_user_fields(self, data):
+        def strip(item):
+            return {name: value for name, value in item.items() if name not in self.user_fields}
+
+        if isinstance(data, dict):
+            return {**data, 'results': [strip(item) for item in data['results']]}
+        return [strip(item) for item in data]
+
+    def overlay_user_fields(self, results):
+        pass
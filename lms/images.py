@@ -0,0 +1,67 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Параметры Pillow для каждого формата уменьшенных копий
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'method': 4},
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+}
+
+
+def needs_variants(field_file, variants):
+    """Копии устарели: картинку заменили, удалили или копий еще нет."""
+    return (field_file.name or None) != variants.get('source')
+
+
+def render_variants(field_file):
+    """Сохраняет уменьшенные копии картинки в ее storage.
+
+    Возвращает {'source': имя оригинала, 'thumb': {'webp': путь, 'jpeg': путь}, ...}.
+    Если файл не читается как картинка, копий нет, но source запоминается,
+    чтобы не пытаться снова до следующей загрузки.
+    """
+    variants = {'source': field_file.name}
+    try:
+        with field_file.open('rb'):
+            image = ImageOps.exif_transpose(Image.open(field_file))
+            image.load()
+    except (OSError, Image.DecompressionBombError):
+        logger.warning('Не удалось открыть картинку %s', field_file.name, exc_info=True)
+        return variants
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    for size_name, size in settings.IMAGE_VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        variants[size_name] = {}
+        for image_format in settings.IMAGE_VARIANT_FORMATS:
+            converted = resized
+            if image_format == 'jpeg' and has_alpha:
+                # в JPEG нет прозрачности, подкладываем белый фон
+                converted = Image.new('RGB', resized.size, 'white')
+                converted.paste(resized, mask=resized.getchannel('A'))
+            buffer = BytesIO()
+            converted.save(buffer, quality=settings.IMAGE_VARIANT_QUALITY, **SAVE_OPTIONS[image_format])
+            path = f'{directory}/variants/{stem}_{size_name}.{image_format}'
+            variants[size_name][image_format] = field_file.storage.save(path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Удаляет файлы уменьшенных копий (оригинал не трогает)."""
+    for size_name, paths in variants.items():
+        if size_name == 'source':
+            continue
+        for path in paths.values():
+            storage.delete(path)
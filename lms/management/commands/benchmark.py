@@ -0,0 +1,71 @@
+import json
+import random
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from lms.benchmarks import SCENARIOS, compare_results, run_benchmark
+
+
+class Command(BaseCommand):
+    """Нагрузочный прогон эндпоинтов lms и users на текущей базе.
+
+    Запускать только на отдельной базе: --seed добавляет данные, а подписка и
+    оплата меняют их во время прогона. Stripe и currencyapi заменяются
+    локальным HTTP сервером, письма не отправляются.
+    """
+    help = 'Замеряет p50/p95, пропускную способность и число SQL запросов по эндпоинтам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Сначала заполнить базу командой seed')
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--courses', type=int, default=10_000)
+        parser.add_argument('--lessons', type=int, default=1_000_000)
+        parser.add_argument('--subscriptions', type=int, default=5_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на эндпоинт')
+        parser.add_argument('--warmup', type=int, default=10, help='Запросов прогрева на поток')
+        parser.add_argument('--concurrency', type=int, default=1, help='Потоков на эндпоинт')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        if options['seed']:
+            call_command(
+                'seed', users=options['users'], courses=options['courses'], lessons=options['lessons'],
+                subscriptions=options['subscriptions'], payments=0, batch_size=options['batch_size'],
+                random_seed=options['random_seed'], stdout=self.stdout,
+            )
+
+        # testserver в ALLOWED_HOSTS и locmem почта, как в тестах
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            test_environment = False  # уже внутри тестов
+        else:
+            test_environment = True
+        try:
+            results = run_benchmark(
+                options['endpoints'], options['requests'], options['warmup'], options['concurrency'], rng
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if test_environment:
+                teardown_test_environment()
+
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        for name, result in results['endpoints'].items():
+            self.stdout.write(
+                f"{name}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                f"{result['throughput_rps']} rps, {result['queries_per_request']} SQL/запрос, ошибок {result['errors']}"
+            )
+        if options['compare']:
+            with open(options['compare']) as file:
+                for line in compare_results(json.load(file), results):
+                    self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}"))
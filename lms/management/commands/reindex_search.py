@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+from django.db import connection
+
+from lms.models import Course, Lesson
+from lms.search import reindex_search
+
+
+class Command(BaseCommand):
+    """Пересчет поискового индекса курсов и уроков (после миграции или смены конфигурации)"""
+    help = 'Заполняет search_vector курсов и уроков пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Полнотекстовый индекс используется только в PostgreSQL')
+            return
+        for model in (Course, Lesson):
+            updated = reindex_search(model, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{model._meta.verbose_name_plural}: {updated} записей'))
@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from lms.models import Course, Lesson
+from lms.seeding import Seeder
+
+
+class Command(BaseCommand):
+    """Синтетические данные для нагрузочных тестов и стенда.
+
+    Одинаковый --random-seed на пустой базе дает одинаковые данные. Если
+    пользователей или курсов создается 0, берутся уже существующие.
+    """
+    help = 'Создает пользователей, курсы, уроки, подписки и платежи пачками (COPY в PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--lessons', type=int, default=10_000)
+        parser.add_argument('--subscriptions', type=int, default=10_000)
+        parser.add_argument('--payments', type=int, default=10_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('--email-prefix', default='seed', help='Почта пользователей: <prefix>-N@example.com')
+        parser.add_argument('--no-copy', action='store_true', help='Только bulk_create, без COPY')
+
+    def handle(self, *args, **options):
+        seeder = Seeder(random.Random(options['random_seed']), options['batch_size'], use_copy=not options['no_copy'])
+        started = time.monotonic()
+
+        new_user_ids = seeder.users(options['users'], options['email_prefix'])
+        user_ids = new_user_ids or list(get_user_model().objects.values_list('pk', flat=True))
+        if not user_ids and any(options[name] for name in ('courses', 'lessons', 'subscriptions', 'payments')):
+            raise CommandError('Нет пользователей: укажите --users')
+        new_course_ids = seeder.courses(options['courses'], user_ids) if options['courses'] else []
+        course_ids = new_course_ids or list(Course.objects.values_list('pk', flat=True))
+        if not course_ids and any(options[name] for name in ('lessons', 'subscriptions', 'payments')):
+            raise CommandError('Нет курсов: укажите --courses')
+
+        lessons = seeder.lessons(options['lessons'], course_ids, user_ids) if options['lessons'] else 0
+        subscriptions = seeder.subscriptions(options['subscriptions'], user_ids, course_ids) if options['subscriptions'] else 0
+        payments = 0
+        if options['payments']:
+            lesson_ids = list(Lesson.objects.values_list('pk', flat=True))
+            payments = seeder.payments(options['payments'], user_ids, course_ids, lesson_ids)
+        seeder.finish(payments=bool(payments))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.monotonic() - started:.1f} с: пользователей {len(new_user_ids)}, '
+            f'курсов {len(new_course_ids)}, уроков {lessons}, подписок {subscriptions}, платежей {payments}'
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0003_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='stripe_price_fingerprint',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Сумма и валюта цены в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_price_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID цены в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID продукта в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='stripe_price_fingerprint',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='Сумма и валюта цены в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='stripe_price_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID цены в Stripe'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='stripe_product_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID продукта в Stripe'),
+        ),
+    ]
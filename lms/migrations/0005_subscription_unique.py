@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+from lms.operations import AddUniqueConstraintConcurrently
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    """Оставляем по одной подписке на пару (user, course) перед созданием ограничения."""
+    Subscription = apps.get_model('lms', 'Subscription')
+    keep_ids = (
+        Subscription.objects.values('user_id', 'course_id').annotate(keep_id=Min('id')).values('keep_id')
+    )
+    Subscription.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # индекс строится CONCURRENTLY, что невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('lms', '0004_stripe_product_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_subscriptions, migrations.RunPython.noop, atomic=True),
+        AddUniqueConstraintConcurrently(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_user_course_subscription'),
+        ),
+    ]
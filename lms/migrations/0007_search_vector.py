@@ -0,0 +1,79 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from lms.operations import AddIndexConcurrently
+
+SEARCH_TABLES = ('lms_course', 'lms_lesson')
+
+# Веса и конфигурация совпадают с lms.search.SEARCH_VECTOR
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION lms_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian'::regconfig, COALESCE(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian'::regconfig, COALESCE(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+CREATE_TRIGGER = """
+CREATE TRIGGER {table}_search_vector_update
+BEFORE INSERT OR UPDATE OF title, description ON {table}
+FOR EACH ROW EXECUTE FUNCTION lms_search_vector_update();
+"""
+DROP_TRIGGER = 'DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table};'
+DROP_FUNCTION = 'DROP FUNCTION IF EXISTS lms_search_vector_update();'
+
+
+def create_triggers(apps, schema_editor):
+    """Триггер поддерживает search_vector при любых INSERT/UPDATE, включая bulk_create.
+
+    Существующие записи заполняются командой reindex_search.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_FUNCTION)
+    for table in SEARCH_TABLES:
+        schema_editor.execute(CREATE_TRIGGER.format(table=table))
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(DROP_TRIGGER.format(table=table))
+    schema_editor.execute(DROP_FUNCTION)
+
+
+class Migration(migrations.Migration):
+    # индексы строятся CONCURRENTLY, что невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('lms', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        AddIndexConcurrently(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+            postgres_only=True,
+        ),
+        AddIndexConcurrently(
+            model_name='lesson',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='lesson_search_vector_idx'),
+            postgres_only=True,
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from config import settings
@@ -15,6 +17,13 @@ class Course(models.Model):
         null=True,
         verbose_name='Превью картинка курса'
     )
+    # пути к копиям, которые делает lms.tasks.generate_image_variants
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     description = models.TextField(
         blank=True,
         null=True,
@@ -26,10 +35,42 @@ class Course(models.Model):
         blank=True,
         null=True,
         verbose_name='создатель', )
+    stripe_product_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='ID продукта в Stripe'
+    )
+    stripe_price_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='ID цены в Stripe'
+    )
+    stripe_price_fingerprint = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        verbose_name='Сумма и валюта цены в Stripe'
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    # заполняется триггером в PostgreSQL, см. lms.search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый индекс'
+    )
 
     class Meta:
         verbose_name = 'курс'
         verbose_name_plural = 'курсы'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ]
 
 
 class Lesson(models.Model):
@@ -48,6 +89,13 @@ class Lesson(models.Model):
         null=True,
         verbose_name='Превью картинка урока'
     )
+    # пути к копиям, которые делает lms.tasks.generate_image_variants
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     video_link = models.URLField(
         max_length=250,
         blank=True,
@@ -66,10 +114,42 @@ class Lesson(models.Model):
         blank=True,
         null=True,
         verbose_name='создатель', )
+    stripe_product_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='ID продукта в Stripe'
+    )
+    stripe_price_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='ID цены в Stripe'
+    )
+    stripe_price_fingerprint = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        verbose_name='Сумма и валюта цены в Stripe'
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    # заполняется триггером в PostgreSQL, см. lms.search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый индекс'
+    )
 
     class Meta:
         verbose_name = 'урок'
         verbose_name_plural = 'уроки'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='lesson_search_vector_idx'),
+        ]
 
 
 class Subscription(models.Model):
@@ -87,4 +167,7 @@ class Subscription(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_user_course_subscription'),
+        ]
 
@@ -0,0 +1,59 @@
+from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+from django.db.migrations import AddConstraint, AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY без блокировки записи в таблицу на время построения.
+
+    Только в миграциях с atomic = False. В остальных базах (SQLite в тестах) -
+    обычный AddIndex, а при postgres_only=True индекс не создается вовсе
+    (например, GIN).
+    """
+
+    def __init__(self, model_name, index, postgres_only=False):
+        super().__init__(model_name, index)
+        self.postgres_only = postgres_only
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        if self.postgres_only:
+            kwargs['postgres_only'] = True
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        elif not self.postgres_only:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        elif not self.postgres_only:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """UNIQUE ограничение без блокировки записи на время построения индекса.
+
+    В PostgreSQL индекс строится CREATE UNIQUE INDEX CONCURRENTLY и затем
+    становится ограничением через ADD CONSTRAINT ... UNIQUE USING INDEX.
+    Только в миграциях с atomic = False; в остальных базах - обычный
+    AddConstraint. Состояние модели то же, что у AddConstraint.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote_name = schema_editor.quote_name
+        table = quote_name(model._meta.db_table)
+        name = quote_name(self.constraint.name)
+        columns = ', '.join(quote_name(model._meta.get_field(field).column) for field in self.constraint.fields)
+        schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})')
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+    def describe(self):
+        return f'Concurrently create constraint {self.constraint.name} on model {self.model_name}'
@@ -1,7 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Наибольшее значение bigint (BigAutoField, LIMIT в PostgreSQL)
+MAX_BIGINT = 2 ** 63 - 1
+
+
+def get_limit_param(request, name):
+    """Положительное целое из query параметра name или None, если его нет.
+
+    Разбор через IntegerField: str.isdigit() пропускает символы вроде '²',
+    на которых падает int().
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return serializers.IntegerField(min_value=1, max_value=MAX_BIGINT).run_validation(value)
+    except serializers.ValidationError:
+        raise serializers.ValidationError({name: 'Должно быть целым положительным числом'})
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (ordering_field, id) без COUNT(*) и OFFSET.
+
+    Порядок берется из атрибута view `keyset_ordering`, последним полем
+    должен идти уникальный id. Курсор хранит значения полей последней строки.
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_position_filter(self, position):
+        """(a, b) после (x, y): a <= x AND (a < x OR b < y) для убывающего порядка.
+
+        Первое условие - диапазон по ведущей колонке индекса, остальное
+        отсекает уже выданные строки с тем же значением.
+        """
+        lookups = []
+        for name, value in zip(self.ordering, position):
+            field = name.lstrip('-')
+            lookups.append((field, 'lt' if name.startswith('-') else 'gt', value))
+
+        strictly_after = []
+        for i, (field, lookup, value) in enumerate(lookups):
+            equal = {prev_field: prev_value for prev_field, _, prev_value in lookups[:i]}
+            strictly_after.append(Q(**equal, **{f'{field}__{lookup}': value}))
+
+        field, lookup, value = lookups[0]
+        leading_range = Q(**{f'{field}__{lookup}e': value})
+        return leading_range & reduce(lambda a, b: a | b, strictly_after)
+
+    def decode_cursor(self, request, queryset):
+        """Значения курсора, приведенные к типам полей ordering (аннотации - по output_field)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+
+        values = []
+        for name, value in zip(self.ordering, position):
+            name = name.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+            try:
+                value = field.to_python(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound('Invalid cursor')
+            if value is None:
+                raise NotFound('Invalid cursor')
+            values.append(value)
+        return values
+
+    def encode_cursor(self, instance):
+        position = [getattr(instance, name.lstrip('-')) for name in self.ordering]
+        encoded = base64.urlsafe_b64encode(json.dumps(position, cls=DjangoJSONEncoder).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SelectablePagination(BasePagination):
+    """Выбор пагинации: keyset по умолчанию, ?pagination=offset - страницы с count.
+
+    View может поменять режим по умолчанию атрибутом `pagination_mode`.
+    """
+    mode_query_param = 'pagination'
+    paginators = {
+        'cursor': KeysetPagination,
+        'offset': CustomPagination,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.mode_query_param, getattr(view, 'pagination_mode', 'cursor'))
+        if mode not in self.paginators:
+            raise NotFound(f'Unknown pagination mode: {mode}')
+        self.paginator = self.paginators[mode]()
+        if mode == 'offset':
+            queryset = queryset.order_by(*getattr(view, 'keyset_ordering', KeysetPagination.ordering))
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination().get_paginated_response_schema(schema)
@@ -0,0 +1,85 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, Replace
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_CONFIG = 'russian'
+# Порядок результатов поиска: сначала релевантные, id - для уникального курсора
+SEARCH_ORDERING = ('-search_rank', 'id')
+
+# То же выражение, что в триггере lms_search_vector_update (миграция 0007)
+SEARCH_VECTOR = (
+    SearchVector('title', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+)
+
+# Как django.utils.html.escape; & заменяется первым
+HTML_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#x27;'))
+
+
+def escape_html(expression):
+    """HTML-экранирование текста в SQL."""
+    for char, entity in HTML_ESCAPES:
+        expression = Replace(expression, Value(char), Value(entity))
+    return expression
+
+
+def search_queryset(queryset, term):
+    """Отбирает записи по запросу и добавляет search_rank и search_headline.
+
+    В PostgreSQL поиск идет по search_vector (GIN индекс), в остальных
+    базах - по вхождению подстроки, совпадение в названии выше описания.
+    search_headline - HTML: текст экранирован, совпадения в <b> (без
+    подсветки вне PostgreSQL).
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        document = escape_html(Concat(
+            'title', Value('. '), Coalesce('description', Value(''), output_field=TextField()), output_field=TextField()
+        ))
+        return queryset.filter(search_vector=query).annotate(
+            # double precision, чтобы значение точно возвращалось из курсора
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+            search_headline=SearchHeadline(document, query, config=SEARCH_CONFIG, max_fragments=2),
+        )
+    return queryset.filter(Q(title__icontains=term) | Q(description__icontains=term)).annotate(
+        search_rank=Case(When(title__icontains=term, then=Value(1.0)), default=Value(0.5), output_field=FloatField()),
+        search_headline=escape_html(F('title')),
+    )
+
+
+def reindex_search(model, batch_size=1000):
+    """Пересчитывает search_vector пачками по id, каждая пачка - отдельный UPDATE."""
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(
+            model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return updated
+        updated += model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(search_vector=SEARCH_VECTOR)
+        last_id = ids[-1]
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск ?search= с сортировкой по релевантности"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        # порядок для пагинации (и курсора) меняется только в этом запросе
+        view.keyset_ordering = SEARCH_ORDERING
+        return search_queryset(queryset, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по названию и описанию',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,201 @@
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils.timezone import now
+
+from lms.freshness import touch_models
+from lms.models import Course, Lesson, Subscription
+from users.models import Payment
+from users.reports import rebuild_payment_summary
+
+# Словарь для названий и описаний, чтобы поиск находил осмысленные совпадения
+WORDS = (
+    'python', 'django', 'основы', 'введение', 'практика', 'проект', 'данные', 'анализ',
+    'алгоритмы', 'веб', 'разработка', 'тестирование', 'базы', 'запросы', 'модели', 'формы',
+    'api', 'безопасность', 'производительность', 'кеш', 'очереди', 'задачи', 'деплой', 'docker',
+    'linux', 'сети', 'математика', 'статистика', 'машинное', 'обучение', 'дизайн', 'интерфейсы',
+)
+CITIES = ('Москва', 'Казань', 'Омск', 'Самара', 'Пермь')
+VIDEO_LINK = 'https://youtube.com/watch?v={}'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def make_text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def copy_value(field, obj):
+    """Значение поля в текстовом формате COPY (NULL - \\N, спецсимволы экранируются)."""
+    value = field.pre_save(obj, add=True)
+    if value is None:
+        return r'\N'
+    if isinstance(field, models.JSONField):
+        value = json.dumps(value, cls=field.encoder)
+    elif not isinstance(value, (str, int)):
+        # строки и числа не требуют подготовки, остальное (даты, Decimal) - через поле
+        value = field.get_db_prep_save(value, connection)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+@contextmanager
+def explicit_auto_now_add(model):
+    """auto_now_add поля берут заданное значение (например, дату платежа в прошлом)."""
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Seeder:
+    """Генератор синтетических данных с детерминированным RNG.
+
+    Строки пишутся пачками по batch_size, каждая пачка - своя транзакция.
+    В PostgreSQL при use_copy пачка уходит одной командой COPY, иначе -
+    через bulk_create. Сигналы не отправляются, кеши и сводка платежей
+    обновляются в finish().
+    """
+
+    def __init__(self, rng, batch_size, use_copy=False):
+        self.rng = rng
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+
+    def insert(self, model, objects, ids=None, ignore_conflicts=False):
+        """Вставляет объекты; id новых строк добавляются в ids, если он передан.
+
+        ignore_conflicts действует только для bulk_create: у COPY такой опции
+        нет, дубли нужно отсеять до вставки.
+        """
+        if not self.use_copy:
+            created = 0
+            for batch in batched(objects, self.batch_size):
+                with transaction.atomic():
+                    batch = model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+                if ids is not None:
+                    ids.extend(obj.pk for obj in batch)
+                created += len(batch)
+            return created
+
+        # COPY не возвращает id, новые строки - все после прежнего максимума
+        last_id = model.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        created = self.copy(model, objects)
+        if ids is not None:
+            ids.extend(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+        return created
+
+    def copy(self, model, objects):
+        fields = [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            buffer = StringIO()
+            for obj in batch:
+                buffer.write('\t'.join(copy_value(field, obj) for field in fields))
+                buffer.write('\n')
+            buffer.seek(0)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.copy_expert(sql, buffer)
+            created += len(batch)
+        return created
+
+    def users(self, count, prefix='seed'):
+        User = get_user_model()
+        offset = User.objects.filter(email__startswith=f'{prefix}-').count()
+        password = make_password(None)
+        users = (
+            User(email=f'{prefix}-{offset + i}@example.com', password=password, city=self.rng.choice(CITIES))
+            for i in range(count)
+        )
+        ids = []
+        self.insert(User, users, ids)
+        return ids
+
+    def courses(self, count, owner_ids):
+        courses = (
+            Course(title=make_text(self.rng, 3), description=make_text(self.rng, 12), owner_id=self.rng.choice(owner_ids))
+            for _ in range(count)
+        )
+        ids = []
+        self.insert(Course, courses, ids)
+        return ids
+
+    def lessons(self, count, course_ids, owner_ids):
+        """Уроки распределяются по курсам по кругу, чтобы у всех курсов было поровну."""
+        lessons = (
+            Lesson(
+                title=make_text(self.rng, 4),
+                description=make_text(self.rng, 20),
+                video_link=VIDEO_LINK.format(i),
+                course_id=course_ids[i % len(course_ids)],
+                owner_id=self.rng.choice(owner_ids),
+            )
+            for i in range(count)
+        )
+        return self.insert(Lesson, lessons)
+
+    def subscriptions(self, count, user_ids, course_ids):
+        """Каждый пользователь подписывается на разные курсы, пары (user, course) не повторяются.
+
+        Курсы, на которые пользователь уже подписан (повторный запуск на
+        существующих пользователях), пропускаются.
+        """
+        per_user, extra = divmod(count, len(user_ids))
+
+        def subscriptions():
+            for batch in batched(enumerate(user_ids), self.batch_size):
+                subscribed = {}
+                for user_id, course_id in Subscription.objects.filter(
+                    user_id__in=[user_id for _, user_id in batch]
+                ).values_list('user_id', 'course_id'):
+                    subscribed.setdefault(user_id, set()).add(course_id)
+                for i, user_id in batch:
+                    user_subscribed = subscribed.get(user_id, ())
+                    available = [course_id for course_id in course_ids if course_id not in user_subscribed]
+                    size = min(per_user + (i < extra), len(available))
+                    for course_id in self.rng.sample(available, size):
+                        yield Subscription(user_id=user_id, course_id=course_id)
+
+        return self.insert(Subscription, subscriptions(), ignore_conflicts=True)
+
+    def payments(self, count, user_ids, course_ids, lesson_ids, days=365):
+        """Платежи за курсы и уроки (примерно 4 к 1) с датами за последние days дней."""
+        today = now().date()
+
+        def payments():
+            for _ in range(count):
+                for_lesson = lesson_ids and self.rng.random() < 0.2
+                yield Payment(
+                    user_id=self.rng.choice(user_ids),
+                    payment_date=today - timedelta(days=self.rng.randrange(days)),
+                    course_id=None if for_lesson else self.rng.choice(course_ids),
+                    lesson_id=self.rng.choice(lesson_ids) if for_lesson else None,
+                    amount=self.rng.choice((500, 1000, 5000, 10000)),
+                    payment_method=self.rng.choice(('cash', 'transfer')),
+                    status=Payment.STATUS_READY,
+                )
+
+        with explicit_auto_now_add(Payment):
+            return self.insert(Payment, payments())
+
+    def finish(self, payments=False):
+        """bulk_create и COPY не отправляют сигналы: сбрасываем кеши списков и пересчитываем сводку."""
+        touch_models(Course, Lesson, Subscription)
+        if payments:
+            rebuild_payment_summary(batch_size=self.batch_size)
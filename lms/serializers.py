@@ -1,43 +1,158 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 
+from config.metrics import TimedSerializerMixin
+
 from lms.models import Course, Lesson, Subscription
+from lms.paginations import MAX_BIGINT
+from lms.signals import touch_courses
 from lms.validators import validate_youtube_url
 
+# Служебные поля оплаты, которые не отдаются в API
+STRIPE_FIELDS = ('stripe_product_id', 'stripe_price_id', 'stripe_price_fingerprint')
+HIDDEN_FIELDS = STRIPE_FIELDS + ('search_vector',)
+
+
+class SearchResultMixin:
+    """Добавляет релевантность и подсветку, если объект найден через ?search="""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'search_rank'):
+            data['search_rank'] = instance.search_rank
+            data['search_headline'] = instance.search_headline
+        return data
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URL уменьшенных копий картинки: {'thumb': {'webp': url, 'jpeg': url}, ...}.
+
+    Пока копии не готовы, отдается пустой словарь и клиент берет оригинал.
+    """
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        urls = {}
+        for size_name, paths in variants.items():
+            if size_name == 'source':
+                continue
+            urls[size_name] = {}
+            for image_format, path in paths.items():
+                url = default_storage.url(path)
+                urls[size_name][image_format] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+def parse_pk(data):
+    """Целый pk из входных данных или None: ошибку для остальных значений
+    сообщит PrimaryKeyRelatedField."""
+    try:
+        pk = int(data)
+    except (TypeError, ValueError):
+        return None
+    return pk if 0 < pk <= MAX_BIGINT else None
+
+
+class CourseField(serializers.PrimaryKeyRelatedField):
+    """Курс урока; при массовом создании берется из заранее загруженных курсов"""
+
+    def to_internal_value(self, data):
+        courses = self.context.get('bulk_courses')
+        pk = parse_pk(data)
+        if courses is not None and pk in courses:
+            return courses[pk]
+        return super().to_internal_value(data)
 
-class LessonSerializer(serializers.ModelSerializer):
+
+class LessonListSerializer(serializers.ListSerializer):
+    """Массовое создание уроков: одна загрузка курсов и один bulk_create"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            course_ids = {parse_pk(item.get('course')) for item in data if isinstance(item, dict)}
+            course_ids.discard(None)
+            self._context['bulk_courses'] = Course.objects.in_bulk(course_ids)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            lessons = Lesson.objects.bulk_create(Lesson(**item) for item in validated_data)
+            touch_courses({lesson.course_id for lesson in lessons})
+        return lessons
+
+
+class LessonSerializer(TimedSerializerMixin, SearchResultMixin, serializers.ModelSerializer):
     """Сериализатор для уроков"""
     video_link = serializers.CharField(validators=[validate_youtube_url])
+    course = CourseField(queryset=Course.objects.all())
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = HIDDEN_FIELDS
+        read_only_fields = ('owner',)
         validators = []
+        list_serializer_class = LessonListSerializer
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(TimedSerializerMixin, SearchResultMixin, serializers.ModelSerializer):
     """Сериализатор для курсов"""
     is_subscribed = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Course
-        fields = '__all__'
+        exclude = HIDDEN_FIELDS
 
     def get_is_subscribed(self, obj):
-        """Проверяем, есть ли подписка у текущего пользователя на этот курс."""
+        """Проверяем, есть ли подписка у текущего пользователя на этот курс.
+
+        В списке значение берется из аннотации queryset'а, запрос к базе
+        делается только для объектов без аннотации (например, после создания).
+        """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_authenticated:
             return Subscription.objects.filter(user=user, course=obj).exists()
         return False
 
 
-class CourseDetailSerializer(serializers.ModelSerializer):
+class CourseDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     '''Создаем новый сериализатор для вывода кол-ва уроков'''
     lessons_count = serializers.SerializerMethodField()
-    lessons = LessonSerializer(many=True, read_only=True)
+    lessons = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+
+    # Колонки урока, которые реально нужны для вывода вложенного списка
+    lesson_fields = (
+        'id', 'title', 'description', 'image', 'image_variants', 'video_link', 'course_id', 'owner_id', 'updated_at',
+    )
 
     def get_lessons_count(self, course):
+        """Берем количество из аннотации, если queryset ее добавил."""
+        if hasattr(course, 'lessons_count'):
+            return course.lessons_count
         return course.lessons.count()
 
+    def get_lessons(self, course):
+        """Берем уроки, заранее загруженные во view (prefetch с to_attr)."""
+        lessons = getattr(course, 'prefetched_lessons', None)
+        if lessons is None:
+            lessons = course.lessons.only(*self.lesson_fields)
+        return LessonSerializer(lessons, many=True, context=self.context).data
+
     class Meta:
-        model = Lesson
-        fields = ('id', 'title', 'description', 'image', 'lessons_count', 'lessons')
+        model = Course
+        fields = ('id', 'title', 'description', 'image', 'image_variants', 'lessons_count', 'lessons')
+
+
+class SubscriptionBatchSerializer(serializers.Serializer):
+    """Массовая подписка или отписка от курсов"""
+    course_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_BIGINT),
+        allow_empty=False,
+        max_length=1000,
+    )
+    action = serializers.ChoiceField(choices=('subscribe', 'unsubscribe'))
@@ -0,0 +1,75 @@
+from django.db import connection, transaction
+
+from lms.freshness import touch_models
+from lms.models import Course, Subscription
+
+SUBSCRIBED = 'subscribed'
+UNSUBSCRIBED = 'unsubscribed'
+
+TOGGLE_SUBSCRIPTION_SQL = '''
+    WITH deleted AS (
+        DELETE FROM {subscription} WHERE user_id = %(user_id)s AND course_id = %(course_id)s
+        RETURNING id
+    ), inserted AS (
+        INSERT INTO {subscription} (user_id, course_id)
+        SELECT %(user_id)s, id FROM {course}
+        WHERE id = %(course_id)s AND NOT EXISTS (SELECT 1 FROM deleted)
+        ON CONFLICT (user_id, course_id) DO NOTHING
+        RETURNING id
+    )
+    SELECT
+        (SELECT count(*) FROM deleted),
+        (SELECT count(*) FROM inserted),
+        EXISTS (SELECT 1 FROM {course} WHERE id = %(course_id)s)
+'''
+
+
+def toggle_subscription(user_id, course_id):
+    """Подписывает или отписывает пользователя от курса.
+
+    На PostgreSQL это один атомарный запрос (DELETE ... RETURNING и
+    INSERT ... ON CONFLICT в одном WITH), поэтому параллельные клики не
+    создают дублей. Возвращает SUBSCRIBED, UNSUBSCRIBED или None, если
+    курса нет.
+    """
+    if connection.vendor == 'postgresql':
+        sql = TOGGLE_SUBSCRIPTION_SQL.format(
+            subscription=Subscription._meta.db_table, course=Course._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user_id': user_id, 'course_id': course_id})
+            deleted, inserted, course_exists = cursor.fetchone()
+        if deleted or inserted:
+            touch_models(Subscription)
+        if deleted:
+            return UNSUBSCRIBED
+        return SUBSCRIBED if course_exists else None
+
+    with transaction.atomic():
+        deleted, _ = Subscription.objects.filter(user_id=user_id, course_id=course_id).delete()
+        if deleted:
+            return UNSUBSCRIBED
+        if not Course.objects.filter(id=course_id).exists():
+            return None
+        Subscription.objects.bulk_create(
+            [Subscription(user_id=user_id, course_id=course_id)], ignore_conflicts=True
+        )
+        touch_models(Subscription)
+        return SUBSCRIBED
+
+
+def set_subscriptions(user_id, course_ids, subscribe):
+    """Подписывает или отписывает пользователя от списка курсов.
+
+    Возвращает id найденных курсов; неизвестные id пропускаются.
+    """
+    found_ids = list(Course.objects.filter(id__in=course_ids).values_list('id', flat=True))
+    if subscribe:
+        Subscription.objects.bulk_create(
+            [Subscription(user_id=user_id, course_id=course_id) for course_id in found_ids],
+            ignore_conflicts=True,
+        )
+    else:
+        Subscription.objects.filter(user_id=user_id, course_id__in=found_ids).delete()
+    touch_models(Subscription)
+    return found_ids
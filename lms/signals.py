@@ -0,0 +1,83 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from lms.freshness import touch_models
+from lms.images import needs_variants
+from lms.models import Course, Lesson, Subscription
+from lms.tasks import generate_image_variants
+
+
+def touch_courses(course_ids):
+    """Изменение уроков считается изменением их курсов."""
+    Course.objects.filter(pk__in=course_ids).update(updated_at=now())
+    touch_models(Course, Lesson)
+
+
+def queue_image_variants(instance, field_name):
+    """После коммита ставит задачу на уменьшенные копии, если картинка сменилась."""
+    if needs_variants(getattr(instance, field_name), getattr(instance, f'{field_name}_variants')):
+        transaction.on_commit(
+            partial(generate_image_variants.delay, instance._meta.label_lower, instance.pk, field_name)
+        )
+
+
+def deleted_by_cascade(instance, origin):
+    """Строка удаляется вместе с другим объектом (курсом, пользователем):
+    кеши сбрасывает receiver этого объекта один раз на весь каскад."""
+    if origin is None or origin is instance:
+        return False
+    return not (isinstance(origin, QuerySet) and origin.model is type(instance))
+
+
+@receiver(post_save, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    touch_models(Course)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    """Уроки и подписки курса удаляются каскадом, их receiver'ы ничего не делают."""
+    touch_models(Course, Lesson, Subscription)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_user_lesson_courses(sender, instance, **kwargs):
+    """Уроки пользователя в чужих курсах удаляются каскадом: запоминаем их курсы."""
+    instance._lesson_course_ids = list(
+        Lesson.objects.filter(owner=instance).values_list('course_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    """Один раз на пользователя: курсы его уроков и подписки."""
+    course_ids = getattr(instance, '_lesson_course_ids', None)
+    if course_ids:
+        touch_courses(course_ids)
+    touch_models(Subscription)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Lesson)
+def image_saved(sender, instance, **kwargs):
+    queue_image_variants(instance, 'image')
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, origin=None, **kwargs):
+    if deleted_by_cascade(instance, origin):
+        return
+    touch_courses([instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(sender, instance, origin=None, **kwargs):
+    if deleted_by_cascade(instance, origin):
+        return
+    touch_models(Subscription)
@@ -1,10 +1,23 @@
+import logging
 from datetime import timedelta
+from itertools import islice
 
-from django.core.mail import send_mail
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import send_mail, send_mass_mail, get_connection
 from celery import shared_task
+from django.db import transaction
+from django.db.models import Q
 from django.utils.timezone import now
 from django.contrib.auth import get_user_model
 
+from lms.images import delete_variants, needs_variants, render_variants
+from lms.models import Course, Subscription
+from users.authentication import blacklist_user_tokens, invalidate_cached_users
+
+logger = logging.getLogger(__name__)
+
+
 @shared_task
 def send_course_update_email(email, course_name):
     send_mail(
@@ -15,10 +28,101 @@ def send_course_update_email(email, course_name):
     )
 
 
+@shared_task
+def notify_course_subscribers(course_id):
+    """Рассылает письмо об обновлении курса всем подписчикам.
+
+    Подписки читаются через iterator(), письма уходят пачками по
+    COURSE_UPDATE_EMAIL_CHUNK_SIZE через одно SMTP соединение.
+    """
+    course = Course.objects.filter(pk=course_id).only('title').first()
+    if course is None:
+        return 0
+
+    subject = f'Обновление курса: {course.title}'
+    message = f'Материалы курса "{course.title}" были обновлены!'
+    chunk_size = settings.COURSE_UPDATE_EMAIL_CHUNK_SIZE
+    emails = (
+        Subscription.objects
+        .filter(course_id=course_id, user__is_active=True)
+        .order_by('pk')
+        .values_list('user__email', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    sent = 0
+    with get_connection() as connection:
+        while chunk := list(islice(emails, chunk_size)):
+            datatuple = [(subject, message, 'noreply@example.com', [email]) for email in chunk]
+            sent += send_mass_mail(datatuple, connection=connection)
+    return sent
+
+
 
 @shared_task
-def deactivate_inactive_users():
+def deactivate_inactive_users(batch_size=None):
+    """Деактивирует пользователей без входа 30 дней пачками по batch_size.
+
+    Пачки идут по частичному индексу (last_login) WHERE is_active с курсором
+    (last_login, id), каждая пачка - отдельная короткая транзакция. Refresh
+    токены деактивированных отзываются, кеш аутентификации сбрасывается.
+    """
     User = get_user_model()
+    batch_size = batch_size or settings.DEACTIVATE_USERS_BATCH_SIZE
     threshold_date = now() - timedelta(days=30)
-    inactive_users = User.objects.filter(last_login__lt=threshold_date, is_active=True)
-    inactive_users.update(is_active=False)
\ No newline at end of file
+    inactive_users = User.objects.filter(last_login__lt=threshold_date, is_active=True).order_by('last_login', 'id')
+
+    processed = revoked_tokens = 0
+    position = None
+    while True:
+        batch = inactive_users
+        if position is not None:
+            last_login, last_id = position
+            batch = batch.filter(
+                Q(last_login__gte=last_login) & (Q(last_login__gt=last_login) | Q(last_login=last_login, id__gt=last_id))
+            )
+        rows = list(batch.values_list('last_login', 'id')[:batch_size])
+        if not rows:
+            break
+        user_ids = [user_id for _, user_id in rows]
+        with transaction.atomic():
+            processed += User.objects.filter(id__in=user_ids, is_active=True).update(is_active=False)
+            revoked_tokens += blacklist_user_tokens(user_ids)
+        invalidate_cached_users(user_ids)
+        position = rows[-1]
+
+    logger.info('Деактивировано пользователей: %s, отозвано токенов: %s', processed, revoked_tokens)
+    return {'processed': processed, 'revoked_tokens': revoked_tokens}
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field_name):
+    """Создает уменьшенные копии картинки field_name и сохраняет пути в <field_name>_variants.
+
+    Картинка обрабатывается вне транзакции; пути записываются, только если
+    за это время картинку не заменили (иначе копии удаляются, их сделает
+    задача для новой картинки).
+    """
+    model = apps.get_model(model_label)
+    variants_name = f'{field_name}_variants'
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    old_variants = getattr(instance, variants_name)
+    if not needs_variants(field_file, old_variants):
+        return
+    variants = render_variants(field_file) if field_file else {}
+
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).first()
+        if current is None or getattr(current, field_name).name != field_file.name:
+            delete_variants(field_file.storage, variants)
+            return
+        setattr(current, variants_name, variants)
+        update_fields = [variants_name]
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            update_fields.append('updated_at')
+        # save(), а не update(): сигналы сбрасывают кеши списков и пользователя
+        current.save(update_fields=update_fields)
+    delete_variants(field_file.storage, old_variants)
@@ -1,14 +1,53 @@
-from django.contrib.auth.models import Group
+import base64
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest import skipUnless
+from unittest.mock import patch
+
+import jwt
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, router
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from kombu import Connection
+from PIL import Image
+from prometheus_client import REGISTRY
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
 
+from config.celery import app as celery_app
+from config.routers import ReplicaRoutingMiddleware
+from config.task_metrics import QueueDepthCollector
+from lms.freshness import get_generations
 from lms.models import Course, Lesson, Subscription
-from users.models import User
+from lms.search import search_queryset
+from lms.services import toggle_subscription
+from lms.images import render_variants
+from lms.tasks import generate_image_variants, notify_course_subscribers, send_course_update_email
+from users.models import Payment, PaymentSummary, User
+from users.roles import MODERATOR_GROUP
+from users.serializers import UserTokenObtainPairSerializer, set_user_claims
 
 
 class CourseAndLessonTests(APITestCase):
     def setUp(self):
-        self.moderator_group = Group.objects.create(name="moderator")
+        self.moderator_group = Group.objects.create(name=MODERATOR_GROUP)
 
         self.owner_user = User.objects.create(
             email="test@test.com", password="12345678"
@@ -26,7 +65,7 @@ class CourseAndLessonTests(APITestCase):
         self.lesson = Lesson.objects.create(
             title="Test Lesson",
             description="Lesson description",
-            link_to_video="http://youtube.com",
+            video_link="http://youtube.com",
             course=self.course,
             owner=self.owner_user,
         )
@@ -37,7 +76,7 @@ class CourseAndLessonTests(APITestCase):
         """
         self.client.force_authenticate(user=self.owner_user)
         data = {"title": "test", "description": "test"}
-        response = self.client.post("/learning/courses/", data)
+        response = self.client.post("/lms/course/", data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Course.objects.count(), 2)
 
@@ -47,7 +86,7 @@ class CourseAndLessonTests(APITestCase):
         """
         self.client.force_authenticate(user=self.moderator_user)
         data = {"title": "test", "description": "test"}
-        response = self.client.post("/learning/courses/", data)
+        response = self.client.post("/lms/course/", data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     def test_retrieve_course_as_owner(self):
@@ -55,7 +94,7 @@ class CourseAndLessonTests(APITestCase):
         Проверяет, что владелец может получить информацию о курсе.
         """
         self.client.force_authenticate(user=self.owner_user)
-        response = self.client.get(f"/learning/courses/{self.course.id}/")
+        response = self.client.get(f"/lms/course/{self.course.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.course.title)
 
@@ -64,7 +103,7 @@ class CourseAndLessonTests(APITestCase):
         Проверяет, что модератор может получить информацию о курсе.
         """
         self.client.force_authenticate(user=self.moderator_user)
-        response = self.client.get(f"/learning/courses/{self.course.id}/")
+        response = self.client.get(f"/lms/course/{self.course.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.course.title)
 
@@ -74,7 +113,7 @@ class CourseAndLessonTests(APITestCase):
         """
         self.client.force_authenticate(user=self.owner_user)
         data = {"title": "Updated Course", "description": "Updated description"}
-        response = self.client.patch(f"/learning/courses/{self.course.id}/", data)
+        response = self.client.patch(f"/lms/course/{self.course.id}/", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.course.refresh_from_db()
         self.assertEqual(self.course.title, "Updated Course")
@@ -88,7 +127,7 @@ class CourseAndLessonTests(APITestCase):
             "title": "Updated Course by Moderator",
             "description": "Updated description by moderator",
         }
-        response = self.client.patch(f"/learning/courses/{self.course.id}/", data)
+        response = self.client.patch(f"/lms/course/{self.course.id}/", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.course.refresh_from_db()
         self.assertEqual(self.course.title, "Updated Course by Moderator")
@@ -98,7 +137,7 @@ class CourseAndLessonTests(APITestCase):
         Проверяет, что владелец может удалить курс.
         """
         self.client.force_authenticate(user=self.owner_user)
-        response = self.client.delete(f"/learning/courses/{self.course.id}/")
+        response = self.client.delete(f"/lms/course/{self.course.id}/")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Course.objects.count(), 0)
 
@@ -107,7 +146,7 @@ class CourseAndLessonTests(APITestCase):
         Проверяет, что модератор может удалить курс.
         """
         self.client.force_authenticate(user=self.moderator_user)
-        response = self.client.delete(f"/learning/courses/{self.course.id}/")
+        response = self.client.delete(f"/lms/course/{self.course.id}/")
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     def test_subscribe_and_unsubscribe(self):
@@ -117,14 +156,14 @@ class CourseAndLessonTests(APITestCase):
         self.client.force_authenticate(user=self.owner_user)
 
         data = {"course_id": self.course.id}
-        response = self.client.post("/users/subs/", data)
+        response = self.client.post("/lms/subscription/", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Подписка добавлена")
 
         subscription = Subscription.objects.filter(user=self.owner_user, course=self.course)
         self.assertTrue(subscription.exists())
 
-        response = self.client.post("/users/subs/", data)
+        response = self.client.post("/lms/subscription/", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["message"], "Подписка удалена")
 
@@ -134,7 +173,8 @@ class CourseAndLessonTests(APITestCase):
 
 class LessonTest(APITestCase):
     def setUp(self):
-        self.moderator_group = Group.objects.create(name="moderator")
+        cache.clear()
+        self.moderator_group = Group.objects.create(name=MODERATOR_GROUP)
 
         self.owner_user = User.objects.create(
             email="test@test.com", password="12345678"
@@ -152,7 +192,7 @@ class LessonTest(APITestCase):
         self.lesson = Lesson.objects.create(
             title="Test Lesson",
             description="Lesson description",
-            link_to_video="http://youtube.com",
+            video_link="http://youtube.com",
             course=self.course,
             owner=self.owner_user,
         )
@@ -165,10 +205,10 @@ class LessonTest(APITestCase):
         data = {
             "title": "test",
             "description": "test",
-            "link_to_video": "http://youtube.com",
+            "video_link": "http://youtube.com",
             "course": self.course.id,
         }
-        response = self.client.post("/learning/lessons/", data)
+        response = self.client.post("/lms/lessons/create/", data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Lesson.objects.count(), 2)
 
@@ -180,10 +220,10 @@ class LessonTest(APITestCase):
         data = {
             "title": "test",
             "description": "test",
-            "link_to_video": "http://youtube.com",
+            "video_link": "http://youtube.com",
             "course": self.course.id,
         }
-        response = self.client.post("/learning/lessons/", data)
+        response = self.client.post("/lms/lessons/create/", data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     def test_retrieve_lesson_as_owner(self):
@@ -191,7 +231,7 @@ class LessonTest(APITestCase):
         Проверяет, что владелец может получить информацию об уроке.
         """
         self.client.force_authenticate(user=self.owner_user)
-        response = self.client.get(f"/learning/lessons/{self.lesson.id}/")
+        response = self.client.get(f"/lms/lessons/{self.lesson.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.lesson.title)
 
@@ -200,7 +240,7 @@ class LessonTest(APITestCase):
         Проверяет, что модератор может получить информацию об уроке.
         """
         self.client.force_authenticate(user=self.moderator_user)
-        response = self.client.get(f"/learning/lessons/{self.lesson.id}/")
+        response = self.client.get(f"/lms/lessons/{self.lesson.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.lesson.title)
 
@@ -210,7 +250,7 @@ class LessonTest(APITestCase):
         """
         self.client.force_authenticate(user=self.owner_user)
         data = {"title": "Updated Lesson", "description": "Updated description"}
-        response = self.client.patch(f"/learning/lessons/{self.lesson.id}/", data)
+        response = self.client.patch(f"/lms/lessons/{self.lesson.id}/update", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.lesson.refresh_from_db()
         self.assertEqual(self.lesson.title, "Updated Lesson")
@@ -224,7 +264,7 @@ class LessonTest(APITestCase):
             "title": "Updated Lesson by Moderator",
             "description": "Updated description by moderator",
         }
-        response = self.client.patch(f"/learning/lessons/{self.lesson.id}/", data)
+        response = self.client.patch(f"/lms/lessons/{self.lesson.id}/update", data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.lesson.refresh_from_db()
         self.assertEqual(self.lesson.title, "Updated Lesson by Moderator")
@@ -234,7 +274,7 @@ class LessonTest(APITestCase):
         Проверяет, что владелец может удалить урок.
         """
         self.client.force_authenticate(user=self.owner_user)
-        response = self.client.delete(f"/learning/lessons/{self.lesson.id}/")
+        response = self.client.delete(f"/lms/lessons/{self.lesson.id}/delete")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Lesson.objects.count(), 0)
 
@@ -243,7 +283,7 @@ class LessonTest(APITestCase):
         Проверяет, что модератор может удалить урок.
         """
         self.client.force_authenticate(user=self.moderator_user)
-        response = self.client.delete(f"/learning/lessons/{self.lesson.id}/")
+        response = self.client.delete(f"/lms/lessons/{self.lesson.id}/delete")
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     def test_subscription_for_authenticated_user_with_subscription(self):
@@ -251,25 +291,860 @@ class LessonTest(APITestCase):
         Проверяет, что авторизованный пользователь с подпиской видит свою подписку.
         """
         self.client.force_authenticate(user=self.owner_user)
-        Subscription.objects.create(user=self.owner_user, course=self.course)
-        response = self.client.get("/users/subs/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=self.owner_user, course=self.course)
+        response = self.client.get("/lms/course/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["course"], self.course.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertTrue(response.data["results"][0]["is_subscribed"])
 
     def test_subscription_for_authenticated_user_without_subscription(self):
         """
-        Проверяет, что авторизованный пользователь без подписки видит пустой список.
+        Проверяет, что авторизованный пользователь без подписки не видит подписки.
         """
         self.client.force_authenticate(user=self.owner_user)
-        response = self.client.get("/users/subs/")
+        response = self.client.get("/lms/course/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertFalse(response.data["results"][0]["is_subscribed"])
 
     def test_subscription_for_unauthenticated_user(self):
         """
         Проверяет, что неавторизованный пользователь получает ошибку доступа.
         """
-        response = self.client.get("/users/subs/")
+        response = self.client.get("/lms/course/")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertEqual(response.data["detail"], "Authentication credentials were not provided.")
+
+
+class CourseListQueryCountTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="subscriber@test.com", password="12345678")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.courses = Course.objects.bulk_create(
+            Course(title=f"Course {i}", owner=self.user) for i in range(20)
+        )
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+
+    def test_is_subscribed_without_n_plus_one(self):
+        """
+        Проверяет, что список курсов не делает запрос на каждый курс.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get("/lms/course/", {"page_size": 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        subscribed = {item["id"]: item["is_subscribed"] for item in response.data["results"]}
+        self.assertTrue(subscribed[self.courses[0].id])
+        self.assertFalse(subscribed[self.courses[1].id])
+
+
+class CourseDetailQueryCountTest(APITestCase):
+    def setUp(self):
+        self.owner_user = User.objects.create(email="owner@test.com", password="12345678")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner_user)
+        self.course = Course.objects.create(title="Big Course", owner=self.owner_user)
+        Lesson.objects.bulk_create(
+            Lesson(title=f"Lesson {i}", course=self.course, owner=self.owner_user) for i in range(30)
+        )
+
+    def test_retrieve_lessons_count_and_lessons(self):
+        """
+        Проверяет, что детальная страница курса не зависит от количества уроков по запросам.
+        """
+        # роли, курс с количеством уроков (и updated_at для ETag), уроки
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/lms/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["lessons_count"], 30)
+        self.assertEqual(len(response.data["lessons"]), 30)
+
+    def test_retrieve_lessons_limit(self):
+        """
+        Проверяет, что ?lessons_limit= ограничивает вложенные уроки, но не общее количество.
+        """
+        response = self.client.get(f"/lms/course/{self.course.id}/", {"lessons_limit": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["lessons_count"], 30)
+        self.assertEqual(len(response.data["lessons"]), 5)
+
+    def test_retrieve_invalid_lessons_limit(self):
+        """
+        Проверяет, что некорректный lessons_limit возвращает ошибку валидации.
+        """
+        for limit in ("abc", "0", "²", str(2 ** 63)):
+            response = self.client.get(f"/lms/course/{self.course.id}/", {"lessons_limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, limit)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="reader@test.com", password="12345678")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        course = Course.objects.create(title="Course", owner=self.user)
+        self.lessons = Lesson.objects.bulk_create(
+            Lesson(title=f"Lesson {i}", course=course) for i in range(12)
+        )
+
+    def test_cursor_pages_without_count(self):
+        """
+        Проверяет, что по курсору обходятся все уроки одним запросом на страницу.
+        """
+        ids = []
+        url = "/lms/lessons/"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {"page_size": 5} if url == "/lms/lessons/" else None)
+            self.assertNotIn("count", response.data)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, [lesson.id for lesson in self.lessons])
+
+    def test_offset_pagination_opt_in(self):
+        """
+        Проверяет, что ?pagination=offset возвращает номера страниц и count.
+        """
+        response = self.client.get("/lms/lessons/", {"pagination": "offset", "page": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(response.data["results"][0]["id"], self.lessons[5].id)
+
+    def test_invalid_cursor(self):
+        """
+        Проверяет, что испорченный курсор дает 404.
+        """
+        response = self.client.get("/lms/lessons/", {"cursor": "broken"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        cursor = base64.urlsafe_b64encode(json.dumps([{"a": 1}]).encode()).decode()
+        response = self.client.get("/lms/course/", {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CourseUpdateNotificationTest(APITestCase):
+    def setUp(self):
+        self.owner_user = User.objects.create(email="owner@test.com", password="12345678")
+        self.course = Course.objects.create(title="Course", owner=self.owner_user)
+        subscribers = User.objects.bulk_create(
+            User(email=f"subscriber{i}@test.com", is_active=True) for i in range(5)
+        )
+        Subscription.objects.bulk_create(Subscription(user=user, course=self.course) for user in subscribers)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner_user)
+
+    def test_update_enqueues_single_task(self):
+        """
+        Проверяет, что обновление курса ставит одну задачу рассылки.
+        """
+        with patch("lms.views.notify_course_subscribers.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.put(f"/lms/course/{self.course.id}/", {"title": "Updated"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delay.assert_called_once_with(self.course.id)
+
+    @override_settings(COURSE_UPDATE_EMAIL_CHUNK_SIZE=2)
+    def test_notify_course_subscribers_in_chunks(self):
+        """
+        Проверяет, что задача отправляет письмо каждому подписчику пачками.
+        """
+        self.assertEqual(notify_course_subscribers(self.course.id), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].subject, "Обновление курса: Course")
+
+
+class LessonBulkCreateTest(APITestCase):
+    def setUp(self):
+        self.owner_user = User.objects.create(email="owner@test.com", password="12345678")
+        self.course = Course.objects.create(title="Course", owner=self.owner_user)
+        self.other_course = Course.objects.create(title="Other", owner=self.owner_user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner_user)
+
+    def lesson(self, i, course, video_link="https://youtube.com/watch?v=1"):
+        return {"title": f"Lesson {i}", "course": course.id, "video_link": video_link}
+
+    def test_bulk_create(self):
+        """
+        Проверяет, что уроки создаются одним запросом вставки с владельцем.
+        """
+        data = [self.lesson(i, self.course) for i in range(50)] + [self.lesson(50, self.other_course)]
+        # роли, курсы, savepoint + insert + updated_at курсов + release
+        with self.assertNumQueries(6):
+            response = self.client.post("/lms/lessons/bulk_create/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 51)
+        self.assertEqual(Lesson.objects.filter(owner=self.owner_user).count(), 51)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """
+        Проверяет, что при ошибке ничего не создается, а ошибки указаны по каждому уроку.
+        """
+        data = [
+            self.lesson(0, self.course),
+            self.lesson(1, self.course, video_link="https://vimeo.com/1"),
+            {"title": "Lesson 2", "course": 999999, "video_link": "https://youtube.com/2"},
+            {"title": "Lesson 3", "course": "²", "video_link": "https://youtube.com/3"},
+            {"title": "Lesson 4", "course": str(2 ** 64), "video_link": "https://youtube.com/4"},
+            {"title": "Lesson 5", "course": {"id": 1}, "video_link": "https://youtube.com/5"},
+        ]
+        response = self.client.post("/lms/lessons/bulk_create/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("video_link", response.data[1])
+        for errors in response.data[2:]:
+            self.assertIn("course", errors)
+        self.assertFalse(Lesson.objects.exists())
+
+
+class SubscriptionToggleTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="subscriber@test.com", password="12345678")
+        self.courses = Course.objects.bulk_create(Course(title=f"Course {i}") for i in range(3))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_toggle(self):
+        """
+        Проверяет подписку и отписку через lms/subscription/.
+        """
+        data = {"course_id": self.courses[0].id}
+        response = self.client.post("/lms/subscription/", data)
+        self.assertEqual(response.data["message"], "Подписка добавлена")
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 1)
+
+        response = self.client.post("/lms/subscription/", data)
+        self.assertEqual(response.data["message"], "Подписка удалена")
+        self.assertFalse(Subscription.objects.filter(user=self.user).exists())
+
+    def test_toggle_unknown_course(self):
+        """
+        Проверяет, что подписка на несуществующий курс дает 404.
+        """
+        for course_id in (999999, "abc", "²", 2 ** 64, 0):
+            response = self.client.post("/lms/subscription/", {"course_id": course_id})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, course_id)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_batch_rejects_out_of_range_ids(self):
+        """
+        Проверяет, что id вне диапазона bigint в массовой подписке - ошибка валидации.
+        """
+        response = self.client.post(
+            "/lms/subscription/batch/", {"course_ids": [2 ** 64], "action": "subscribe"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == "postgresql", "один запрос только на PostgreSQL")
+    def test_toggle_single_statement(self):
+        """
+        Проверяет, что переключение подписки - один SQL запрос.
+        """
+        with self.assertNumQueries(1):
+            toggle_subscription(self.user.id, self.courses[0].id)
+
+    def test_unique_subscription(self):
+        """
+        Проверяет, что дубль подписки запрещен ограничением.
+        """
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+        with self.assertRaises(IntegrityError):
+            Subscription.objects.create(user=self.user, course=self.courses[0])
+
+    def test_batch_subscribe_and_unsubscribe(self):
+        """
+        Проверяет массовую подписку и отписку с отчетом о неизвестных курсах.
+        """
+        course_ids = [course.id for course in self.courses]
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+        response = self.client.post(
+            "/lms/subscription/batch/",
+            {"course_ids": course_ids + [999999], "action": "subscribe"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["not_found"], [999999])
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 3)
+
+        response = self.client.post(
+            "/lms/subscription/batch/", {"course_ids": course_ids[:2], "action": "unsubscribe"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Subscription.objects.values_list("course_id", flat=True)), [self.courses[2].id])
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner_user = User.objects.create(email="owner@test.com", password="12345678")
+        self.course = Course.objects.create(title="Course", owner=self.owner_user)
+        self.lesson = Lesson.objects.create(title="Lesson", course=self.course, owner=self.owner_user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner_user)
+
+    def test_course_detail_not_modified(self):
+        """
+        Проверяет 304 на детальной странице курса по ETag одним запросом к базе.
+        """
+        response = self.client.get(f"/lms/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        # роли + updated_at курса
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/lms/course/{self.course.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_lesson_detail_without_extra_query(self):
+        """
+        Проверяет, что безусловный запрос урока не читает updated_at отдельным запросом,
+        а его ETag совпадает с ETag условного.
+        """
+        # роли + урок
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/lms/lessons/{self.lesson.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(f"/lms/lessons/{self.lesson.id}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_course_detail_changes_with_lessons(self):
+        """
+        Проверяет, что изменение урока меняет ETag курса.
+        """
+        etag = self.client.get(f"/lms/course/{self.course.id}/")["ETag"]
+        Course.objects.filter(pk=self.course.pk).update(updated_at=now() - timedelta(minutes=1))
+        etag = self.client.get(f"/lms/course/{self.course.id}/")["ETag"]
+
+        self.lesson.title = "Updated"
+        self.lesson.save()
+        response = self.client.get(f"/lms/course/{self.course.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["lessons"][0]["title"], "Updated")
+
+    def test_lesson_list_if_modified_since(self):
+        """
+        Проверяет 304 списка уроков по If-Modified-Since без запросов к базе.
+        """
+        response = self.client.get("/lms/lessons/")
+        last_modified = response["Last-Modified"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/lms/lessons/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_course_list_changes_after_subscription(self):
+        """
+        Проверяет, что подписка меняет ETag списка курсов (поле is_subscribed).
+        """
+        etag = self.client.get("/lms/course/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/lms/subscription/", {"course_id": self.course.id})
+        response = self.client.get("/lms/course/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["results"][0]["is_subscribed"])
+
+    def test_lesson_detail_requires_permission(self):
+        """
+        Проверяет, что 304 не выдается без прав на объект.
+        """
+        etag = self.client.get(f"/lms/lessons/{self.lesson.id}/")["ETag"]
+        self.client.force_authenticate(user=User.objects.create(email="other@test.com"))
+        response = self.client.get(f"/lms/lessons/{self.lesson.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CascadeDeleteTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email="owner@test.com")
+        self.author = User.objects.create(email="author@test.com")
+        self.course = Course.objects.create(title="Course", owner=self.owner)
+        self.other_course = Course.objects.create(title="Other", owner=self.owner)
+        Lesson.objects.bulk_create(Lesson(title=f"Lesson {i}", course=self.course) for i in range(20))
+        Lesson.objects.bulk_create(
+            Lesson(title=f"Guest {i}", course=self.other_course, owner=self.author) for i in range(5)
+        )
+        subscribers = User.objects.bulk_create(User(email=f"s{i}@test.com") for i in range(20))
+        Subscription.objects.bulk_create(Subscription(user=user, course=self.course) for user in subscribers)
+
+    def test_course_delete_invalidates_once(self):
+        """
+        Проверяет, что удаление курса с уроками и подписками сбрасывает кеши одним
+        callback'ом и без обновления курса по каждому уроку.
+        """
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            self.course.delete()
+        self.assertLessEqual(len(callbacks), 2)
+        self.assertFalse([query for query in queries if query["sql"].startswith('UPDATE "lms_course"')])
+
+    def test_user_delete_touches_lesson_courses_once(self):
+        """
+        Проверяет, что удаление автора уроков в чужом курсе обновляет этот курс одним запросом.
+        """
+        updated_at = self.other_course.updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.author.delete()
+        updates = [query for query in queries if query["sql"].startswith('UPDATE "lms_course"')]
+        self.assertEqual(len(updates), 1)
+        self.other_course.refresh_from_db()
+        self.assertGreater(self.other_course.updated_at, updated_at)
+        self.assertFalse(Lesson.objects.filter(course=self.other_course).exists())
+
+
+class TouchModelsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title="Course")
+
+    @override_settings(DATABASE_REPLICAS=["replica1"])
+    def test_transaction_touched_once(self):
+        """
+        Проверяет, что много изменений в одной транзакции дают одну отметку поколения
+        и одну отложенную повторную отметку.
+        """
+        generation = get_generations(Lesson)[0]
+        with patch("lms.freshness.touch_labels.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(10):
+                    Lesson.objects.create(title=f"Lesson {i}", course=self.course)
+        self.assertEqual(get_generations(Lesson)[0], generation + 1)
+        apply_async.assert_called_once()
+        # плюс модели из откатившихся транзакций предыдущих тестов
+        self.assertLessEqual({"lms.course", "lms.lesson"}, set(apply_async.call_args.args[0][0]))
+
+
+class ListCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@test.com")
+        self.other_user = User.objects.create(email="other@test.com")
+        self.course = Course.objects.create(title="Course")
+        self.lesson = Lesson.objects.create(title="Lesson", course=self.course)
+        Subscription.objects.create(user=self.user, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_lesson_list_cached_until_change(self):
+        """
+        Проверяет, что список уроков берется из кеша до изменения урока.
+        """
+        self.client.get("/lms/lessons/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/lms/lessons/")
+        self.assertEqual(response.data["results"][0]["title"], "Lesson")
+
+        self.lesson.title = "Updated"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        response = self.client.get("/lms/lessons/")
+        self.assertEqual(response.data["results"][0]["title"], "Updated")
+
+    def test_course_list_overlays_is_subscribed(self):
+        """
+        Проверяет, что is_subscribed считается для каждого пользователя поверх кеша.
+        """
+        response = self.client.get("/lms/course/")
+        self.assertTrue(response.data["results"][0]["is_subscribed"])
+
+        self.client.force_authenticate(user=self.other_user)
+        # только подписки пользователя на курсы страницы
+        with self.assertNumQueries(1):
+            response = self.client.get("/lms/course/")
+        self.assertFalse(response.data["results"][0]["is_subscribed"])
+
+        Subscription.objects.create(user=self.other_user, course=self.course)
+        response = self.client.get("/lms/course/")
+        self.assertTrue(response.data["results"][0]["is_subscribed"])
+
+
+class SearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.python_course = Course.objects.create(title="Python для начинающих", description="Основы языка")
+        self.django_course = Course.objects.create(title="Django", description="Веб-приложения на Python")
+        Course.objects.create(title="Рисование", description="Акварель")
+        self.lesson = Lesson.objects.create(
+            title="Установка Python", description="Скачиваем интерпретатор", course=self.python_course
+        )
+        Lesson.objects.create(title="Модели", description="ORM", course=self.django_course)
+
+    def test_search_courses_ranked(self):
+        """
+        Проверяет, что совпадение в названии курса выше совпадения в описании.
+        """
+        response = self.client.get("/lms/course/?search=python")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([item["id"] for item in results], [self.python_course.pk, self.django_course.pk])
+        self.assertGreater(results[0]["search_rank"], results[1]["search_rank"])
+        self.assertIn("search_headline", results[0])
+        self.assertNotIn("search_vector", results[0])
+
+    def test_search_cursor_pagination(self):
+        """
+        Проверяет переход по курсору в порядке релевантности.
+        """
+        response = self.client.get("/lms/course/?search=python&page_size=1")
+        self.assertEqual(response.data["results"][0]["id"], self.python_course.pk)
+        response = self.client.get(response.data["next"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.django_course.pk])
+        self.assertIsNone(response.data["next"])
+
+    def test_search_lessons(self):
+        """
+        Проверяет поиск уроков, в том числе созданных массово.
+        """
+        response = self.client.get("/lms/lessons/?search=python")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.lesson.pk])
+
+        Lesson.objects.bulk_create([Lesson(title="Python и ORM", course=self.django_course)])
+        cache.clear()  # bulk_create без сигналов, кеш списка сбрасывается вручную
+        response = self.client.get("/lms/lessons/?search=python")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_search_headline_escaped(self):
+        """
+        Проверяет, что разметка из названия и описания попадает в подсветку экранированной.
+        """
+        Course.objects.create(title="Python <script>alert(1)</script>", description="<img src=x onerror=alert(1)>")
+        response = self.client.get("/lms/course/?search=python")
+        headlines = " ".join(item["search_headline"] for item in response.data["results"])
+        self.assertNotIn("<script>", headlines)
+        self.assertNotIn("<img", headlines)
+        self.assertIn("&lt;script&gt;", headlines)
+
+    @skipUnless(connection.vendor == "postgresql", "Полнотекстовый поиск есть только в PostgreSQL")
+    def test_search_postgres_stemming_and_reindex(self):
+        """
+        Проверяет морфологию, подсветку и пересчет индекса командой reindex_search.
+        """
+        response = self.client.get("/lms/lessons/?search=установку")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.lesson.pk])
+        self.assertIn("<b>", response.data["results"][0]["search_headline"])
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = search_queryset(Lesson.objects.all(), "установку").explain()
+        self.assertIn("lesson_search_vector_idx", plan)
+
+        Lesson.objects.update(search_vector=None)
+        call_command("reindex_search", batch_size=1, stdout=StringIO())
+        cache.clear()
+        response = self.client.get("/lms/lessons/?search=установку")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.lesson.pk])
+
+
+def make_image(name, size=(1200, 900), mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, size, "red").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create(email="user@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_course(self, image):
+        with patch("lms.signals.generate_image_variants.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                course = Course.objects.create(title="Course", image=image)
+        delay.assert_called_once_with("lms.course", course.pk, "image")
+        return course
+
+    def test_variants_generated_in_background(self):
+        """
+        Проверяет, что копии создаются задачей после коммита и отдаются в списке курсов.
+        """
+        course = self.create_course(make_image("course.png", mode="RGBA"))
+        self.assertEqual(course.image_variants, {})
+
+        generate_image_variants("lms.course", course.pk, "image")
+        course.refresh_from_db()
+        self.assertEqual(course.image_variants["source"], course.image.name)
+        with default_storage.open(course.image_variants["thumb"]["webp"]) as file:
+            thumb = Image.open(file)
+            self.assertEqual((thumb.format, thumb.size), ("WEBP", (200, 150)))
+        with default_storage.open(course.image_variants["medium"]["jpeg"]) as file:
+            self.assertEqual(Image.open(file).format, "JPEG")
+
+        response = self.client.get("/lms/course/")
+        url = response.data["results"][0]["image_variants"]["thumb"]["jpeg"]
+        self.assertTrue(url.startswith("http://testserver/media/school/course_images/variants/"))
+
+    def test_replaced_image_drops_old_variants(self):
+        """
+        Проверяет, что при замене картинки старые копии удаляются.
+        """
+        course = self.create_course(make_image("first.png"))
+        generate_image_variants("lms.course", course.pk, "image")
+        course.refresh_from_db()
+        old_thumb = course.image_variants["thumb"]["webp"]
+
+        course.image = make_image("second.png")
+        course.save()
+        generate_image_variants("lms.course", course.pk, "image")
+        course.refresh_from_db()
+        self.assertEqual(course.image_variants["source"], course.image.name)
+        self.assertFalse(default_storage.exists(old_thumb))
+
+    def test_stale_task_discards_variants(self):
+        """
+        Проверяет, что копии не сохраняются, если картинку заменили во время обработки.
+        """
+        course = self.create_course(make_image("course.png"))
+        rendered = {}
+
+        def replace_then_render(field_file):
+            Course.objects.filter(pk=course.pk).update(image="school/course_images/other.png")
+            rendered.update(render_variants(field_file))
+            return rendered
+
+        with patch("lms.tasks.render_variants", side_effect=replace_then_render):
+            generate_image_variants("lms.course", course.pk, "image")
+        course.refresh_from_db()
+        self.assertEqual(course.image_variants, {})
+        self.assertFalse(default_storage.exists(rendered["thumb"]["webp"]))
+
+
+class BenchmarkCommandTest(APITestCase):
+    databases = {"default", *settings.DATABASE_REPLICAS}
+
+    def test_benchmark_writes_results(self):
+        """
+        Проверяет, что benchmark заполняет базу и пишет метрики по каждому эндпоинту.
+        """
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark", "--seed", "--users", "5", "--courses", "3", "--lessons", "12", "--subscriptions", "8",
+                "--requests", "3", "--warmup", "1", "--output", output.name, stdout=StringIO(),
+            )
+            results = json.load(output)
+
+        self.assertEqual(results["dataset"]["courses"], 3)
+        self.assertEqual(results["dataset"]["lessons"], 12)
+        self.assertEqual(results["dataset"]["subscriptions"], 8)
+        self.assertEqual(set(results["endpoints"]), {
+            "course_list", "course_list_offset", "course_detail", "lesson_list", "lesson_search",
+            "subscription_toggle", "payment_create",
+        })
+        for name, result in results["endpoints"].items():
+            self.assertEqual(result["errors"], 0, name)
+            self.assertEqual(result["requests"], 3)
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            # запросы считаются и на репликах
+            self.assertGreater(result["queries_per_request"], 0, name)
+        # Stripe и currencyapi ответил локальный сервер
+        self.assertTrue(Payment.objects.filter(link__startswith="https://checkout.test/").exists())
+
+
+class SeedCommandTest(APITestCase):
+    def seed(self, *args):
+        call_command(
+            "seed", "--users", "4", "--courses", "3", "--lessons", "9", "--subscriptions", "10",
+            "--payments", "20", "--batch-size", "4", *args, stdout=StringIO(),
+        )
+
+    def test_seed_counts_and_relations(self):
+        """
+        Проверяет количество созданных строк, уникальность подписок и сводку платежей.
+        """
+        self.seed()
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Course.objects.count(), 3)
+        self.assertEqual(Lesson.objects.count(), 9)
+        self.assertEqual(Subscription.objects.count(), 10)
+        self.assertEqual(Payment.objects.count(), 20)
+        self.assertEqual(
+            PaymentSummary.objects.aggregate(total=Sum("payments_count"))["total"], 20
+        )
+        # даты платежей заданы генератором, а не auto_now_add
+        self.assertGreater(Payment.objects.values("payment_date").distinct().count(), 1)
+        if connection.vendor == "postgresql":
+            # COPY вызывает триггер поискового индекса
+            self.assertFalse(Lesson.objects.filter(search_vector__isnull=True).exists())
+
+    def test_seed_is_deterministic(self):
+        """
+        Проверяет, что один и тот же --random-seed дает одинаковые данные (и с COPY, и без).
+        """
+        self.seed("--random-seed", "7", "--email-prefix", "first")
+        self.seed("--random-seed", "7", "--email-prefix", "second", "--no-copy")
+        titles = list(Course.objects.order_by("id").values_list("title", flat=True))
+        self.assertEqual(titles[:3], titles[3:])
+        lessons = list(Lesson.objects.order_by("id").values_list("title", "description"))
+        self.assertEqual(lessons[:9], lessons[9:])
+
+    def test_seed_subscriptions_for_existing_users(self):
+        """
+        Проверяет, что повторный запуск на существующих пользователях и курсах
+        не падает на уникальности подписок и добавляет только новые пары.
+        """
+        self.seed()
+        for args in ((), ("--no-copy",)):
+            call_command(
+                "seed", "--users", "0", "--courses", "0", "--lessons", "0", "--payments", "0",
+                "--subscriptions", "4", "--batch-size", "4", *args, stdout=StringIO(),
+            )
+        self.assertEqual(Subscription.objects.count(), 12)
+
+
+class TaskMetricsTest(APITestCase):
+    task_name = "lms.tasks.send_course_update_email"
+
+    def get_sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, {"task": self.task_name, **labels}) or 0
+
+    def test_task_runtime_outcome_and_queue_wait(self):
+        """
+        Проверяет учет времени выполнения, исхода и ожидания задачи в очереди.
+        """
+        runs = self.get_sample("celery_task_duration_seconds_count", state="SUCCESS")
+        succeeded = self.get_sample("celery_tasks_total", state="SUCCESS")
+        failed = self.get_sample("celery_tasks_total", state="FAILURE")
+        waited = self.get_sample("celery_task_queue_wait_seconds_sum")
+
+        send_course_update_email.apply(("user@test.com", "Course"), headers={"published_at": time.time() - 5})
+        with patch("lms.tasks.send_mail", side_effect=SMTPException):
+            send_course_update_email.apply(("user@test.com", "Course"))
+
+        self.assertEqual(self.get_sample("celery_task_duration_seconds_count", state="SUCCESS"), runs + 1)
+        self.assertEqual(self.get_sample("celery_tasks_total", state="SUCCESS"), succeeded + 1)
+        self.assertEqual(self.get_sample("celery_tasks_total", state="FAILURE"), failed + 1)
+        self.assertGreaterEqual(self.get_sample("celery_task_queue_wait_seconds_sum") - waited, 5)
+
+    def test_queue_depth(self):
+        """
+        Проверяет, что опубликованные задачи получают published_at и видны в длине очереди.
+        """
+        queue = "metrics-test"
+        collector = QueueDepthCollector(celery_app, [queue])
+        with Connection("memory://") as connection, \
+                patch.object(celery_app, "connection_for_read", lambda: Connection("memory://")):
+            for _ in range(3):
+                celery_app.send_task(self.task_name, ("user@test.com", "Course"), queue=queue, connection=connection)
+            [metric] = collector.collect()
+            self.assertEqual(metric.samples[0].labels, {"queue": queue})
+            self.assertEqual(metric.samples[0].value, 3)
+
+            message = connection.SimpleQueue(queue).get(timeout=1)
+            self.assertAlmostEqual(message.headers["published_at"], time.time(), delta=5)
+            connection.SimpleQueue(queue).clear()
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    @staticmethod
+    def view(request):
+        """Как DRF: пользователь только из проверенного токена; код ответа из ?status="""
+        _, _, token = request.headers.get("Authorization", "").partition(" ")
+        try:
+            request.user = User(id=AccessToken(token)["user_id"])
+        except TokenError:
+            request.user = AnonymousUser()
+        return HttpResponse(Course.objects.all().db, status=int(request.GET.get("status", 200)))
+
+    def auth(self, user_id):
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(User(id=user_id))}"}
+
+    def read_db(self, method="get", path="/lms/course/", **headers):
+        return self.middleware(getattr(self.factory, method)(path, **headers)).content.decode()
+
+    def test_safe_requests_read_from_replica(self):
+        """
+        Проверяет, что чтение в GET идет на реплику, а вне запроса и в POST - в default.
+        """
+        self.assertEqual(self.read_db(**self.auth(1)), "replica1")
+        self.assertEqual(self.read_db(), "replica1")
+        self.assertEqual(self.read_db("post", **self.auth(1)), "default")
+        self.assertEqual(Course.objects.all().db, "default")
+        self.assertEqual(router.db_for_write(Course), "default")
+
+    def test_client_sticks_to_primary_after_write(self):
+        """
+        Проверяет, что после записи пользователь читает из default, а другие - с реплики.
+        """
+        self.read_db("post", **self.auth(1))
+        self.assertEqual(self.read_db(**self.auth(1)), "default")
+        self.assertEqual(self.read_db(**self.auth(2)), "replica1")
+
+        cache.clear()  # окно REPLICA_PIN_SECONDS истекло
+        self.assertEqual(self.read_db(**self.auth(1)), "replica1")
+
+    def test_failed_or_unauthenticated_write_does_not_pin(self):
+        """
+        Проверяет, что ответ с ошибкой и запрос с неподписанным токеном не закрепляют клиента за default.
+        """
+        self.read_db("post", "/lms/course/?status=403", **self.auth(1))
+        self.assertEqual(self.read_db(**self.auth(1)), "replica1")
+
+        forged = jwt.encode({"user_id": 1, "token_type": "access"}, "not-the-secret-key-of-this-project", "HS256")
+        self.read_db("post", HTTP_AUTHORIZATION=f"Bearer {forged}")
+        self.assertEqual(self.read_db(**self.auth(1)), "replica1")
+
+    def test_write_in_safe_request_switches_to_primary(self):
+        """
+        Проверяет, что после записи внутри GET чтение в этом запросе идет в default.
+        """
+        def view(request):
+            before = Course.objects.all().db
+            router.db_for_write(Course)
+            return HttpResponse(f"{before} {Course.objects.all().db}")
+
+        response = ReplicaRoutingMiddleware(view)(self.factory.get("/lms/course/"))
+        self.assertEqual(response.content.decode(), "replica1 default")
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "Нужна реплика: DB_REPLICA_HOSTS (например, тот же локальный сервер)")
+class ReplicaRoutingRequestTest(APITransactionTestCase):
+    """Две локальные базы: default и реплика, которая в тестах смотрит в ту же базу отдельным подключением."""
+    databases = {"default", *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="reader@test.com")
+        self.course = Course.objects.create(title="Course", owner=self.user)
+        self.client = APIClient()
+        token = set_user_claims(UserTokenObtainPairSerializer.get_token(self.user).access_token, self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def get_course(self):
+        with CaptureQueriesContext(connection) as primary, \
+                CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]]) as replica:
+            response = self.client.get(f"/lms/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_replica_until_user_writes(self):
+        """
+        Проверяет, что курс читается с реплики, а после подписки (но не после ошибки) - из default.
+        """
+        primary, replica = self.get_course()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post("/lms/subscription/", {"course_id": "missing"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get_course()[0], 0)
+
+        response = self.client.post("/lms/subscription/", {"course_id": self.course.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        primary, replica = self.get_course()
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
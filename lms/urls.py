@@ -2,7 +2,7 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from lms.views import CourseViewSet, LessonListAPIView, LessonRetrieveAPIView, LessonCreateAPIView, LessonUpdateAPIView, \
-    LessonDestroyAPIView, SubscriptionView
+    LessonDestroyAPIView, SubscriptionView, LessonBulkCreateAPIView, SubscriptionBatchView
 from lms.apps import LmsConfig
 
 app_name = LmsConfig.name
@@ -15,9 +15,11 @@ urlpatterns = [
                   path('lessons/', LessonListAPIView.as_view(), name='lesson-list'),
                   path('lessons/<int:pk>/', LessonRetrieveAPIView.as_view(), name='lesson-detail'),
                   path('lessons/create/', LessonCreateAPIView.as_view(), name='lesson-create'),
+                  path('lessons/bulk_create/', LessonBulkCreateAPIView.as_view(), name='lesson-bulk-create'),
                   path('lessons/<int:pk>/update', LessonUpdateAPIView.as_view(), name='lesson-update'),
                   path('lessons/<int:pk>/delete', LessonDestroyAPIView.as_view(), name='lesson-delete'),
                   # subscription
                   path('subscription/', SubscriptionView.as_view(), name='subscription'),
+                  path('subscription/batch/', SubscriptionBatchView.as_view(), name='subscription-batch'),
 
               ] + router.urls
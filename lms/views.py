@@ -1,21 +1,62 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value, BooleanField, Count, Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView, \
-    get_object_or_404
+from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
 
+from lms.freshness import CachedListMixin, ConditionalGetMixin
 from lms.models import Course, Lesson, Subscription
-from lms.paginations import CustomPagination
-from lms.serializers import CourseSerializer, LessonSerializer, CourseDetailSerializer
+from lms.paginations import MAX_BIGINT, SelectablePagination, get_limit_param
+from lms.search import FullTextSearchFilter
+from lms.serializers import CourseSerializer, LessonSerializer, CourseDetailSerializer, SubscriptionBatchSerializer
+from lms.services import SUBSCRIBED, set_subscriptions, toggle_subscription
 from users.permissions import IsModer, IsOwner
-from .tasks import send_course_update_email
+from .tasks import notify_course_subscribers
 
 
-class CourseViewSet(ModelViewSet):
-    queryset = Course.objects.all()
+class CourseViewSet(ConditionalGetMixin, CachedListMixin, ModelViewSet):
+    queryset = Course.objects.defer('search_vector')
+    freshness_models = (Course, Subscription)
+    cache_models = (Course,)
+    user_fields = ('is_subscribed',)
     serializer_class = CourseSerializer
-    pagination_class = CustomPagination
+    pagination_class = SelectablePagination
+    filter_backends = (FullTextSearchFilter,)
+    keyset_ordering = ('id',)
+
+    def get_queryset(self):
+        """Добавляем признак подписки текущего пользователя одним подзапросом."""
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            return queryset.annotate(lessons_count=Count('lessons')).prefetch_related(self.get_lessons_prefetch())
+        user = self.request.user
+        if user.is_authenticated:
+            subscriptions = Subscription.objects.filter(user=user, course=OuterRef('pk'))
+            return queryset.annotate(is_subscribed=Exists(subscriptions))
+        return queryset.annotate(is_subscribed=Value(False, output_field=BooleanField()))
+
+    def overlay_user_fields(self, results):
+        """Подписки текущего пользователя на курсы страницы из кеша."""
+        subscribed = set(
+            Subscription.objects.filter(
+                user=self.request.user, course_id__in=[item['id'] for item in results]
+            ).values_list('course_id', flat=True)
+        ) if self.request.user.is_authenticated else set()
+        for item in results:
+            item['is_subscribed'] = item['id'] in subscribed
+
+    def get_lessons_prefetch(self):
+        """Уроки курса только с нужными колонками, ограниченные ?lessons_limit=."""
+        lessons = Lesson.objects.only(*CourseDetailSerializer.lesson_fields).order_by('id')
+        limit = get_limit_param(self.request, 'lessons_limit')
+        if limit is not None:
+            lessons = lessons[:limit]
+        return Prefetch('lessons', queryset=lessons, to_attr='prefetched_lessons')
 
     def get_serializer_context(self):
         """Передаем текущий запрос в сериализатор."""
@@ -24,9 +65,9 @@ class CourseViewSet(ModelViewSet):
         return context
 
     def perform_update(self, serializer):
+        """Рассылка подписчикам ставится одной задачей после коммита."""
         instance = serializer.save()
-        for subscriber in instance.subscribers.all():
-            send_course_update_email.delay(subscriber.email, instance.name)
+        transaction.on_commit(lambda: notify_course_subscribers.delay(instance.pk))
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -52,23 +93,44 @@ class SubscriptionView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        user = request.user
-        course_id = request.data.get('course_id')
-        course = get_object_or_404(Course, id=course_id)
-        subscription = Subscription.objects.filter(user=user, course=course)
-        if subscription.exists():
-            subscription.delete()
-            message = 'Подписка удалена'
-        else:
-            Subscription.objects.create(user=user, course=course)
-            message = 'Подписка добавлена'
+        try:
+            course_id = serializers.IntegerField(min_value=1, max_value=MAX_BIGINT).run_validation(
+                request.data.get('course_id')
+            )
+        except serializers.ValidationError:
+            raise NotFound()
+        result = toggle_subscription(request.user.pk, course_id)
+        if result is None:
+            raise NotFound()
+        message = 'Подписка добавлена' if result == SUBSCRIBED else 'Подписка удалена'
         return Response({"message": message})
 
 
-class LessonListAPIView(ListAPIView):
-    queryset = Lesson.objects.all()
+class SubscriptionBatchView(APIView):
+    """Подписка или отписка от нескольких курсов одним запросом"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = SubscriptionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course_ids = serializer.validated_data['course_ids']
+        found_ids = set_subscriptions(
+            request.user.pk, course_ids, subscribe=serializer.validated_data['action'] == 'subscribe'
+        )
+        return Response({
+            "course_ids": sorted(found_ids),
+            "not_found": sorted(set(course_ids) - set(found_ids)),
+        })
+
+
+class LessonListAPIView(ConditionalGetMixin, CachedListMixin, ListAPIView):
+    queryset = Lesson.objects.defer('search_vector')
+    freshness_models = (Lesson,)
+    cache_models = (Lesson,)
     serializer_class = LessonSerializer
-    pagination_class = CustomPagination
+    pagination_class = SelectablePagination
+    filter_backends = (FullTextSearchFilter,)
+    keyset_ordering = ('id',)
 
 
 class LessonCreateAPIView(CreateAPIView):
@@ -77,12 +139,25 @@ class LessonCreateAPIView(CreateAPIView):
     permission_classes = (~IsModer, IsAuthenticated)
 
     def perform_create(self, serializer):
-        lesson = serializer.save()
-        lesson.owner = self.request.user
-        lesson.save()
+        serializer.save(owner=self.request.user)
+
+
+class LessonBulkCreateAPIView(CreateAPIView):
+    """Создание списка уроков одним запросом; ошибки возвращаются по каждому уроку"""
+    queryset = Lesson.objects.all()
+    serializer_class = LessonSerializer
+    permission_classes = (~IsModer, IsAuthenticated)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['many'] = True
+        kwargs['max_length'] = settings.LESSON_BULK_CREATE_MAX
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
 
 
-class LessonRetrieveAPIView(RetrieveAPIView):
+class LessonRetrieveAPIView(ConditionalGetMixin, RetrieveAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = (IsAuthenticated, IsModer | IsOwner)
@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+USER_CACHE_KEY = 'auth-user:{}'
+USER_CHANGED_KEY = 'auth-user-changed:{}'
+
+# Claims, из которых можно собрать пользователя без обращения к базе
+USER_CLAIMS = ('email', 'is_staff', 'is_superuser')
+
+
+def invalidate_cached_users(user_ids):
+    """Удаляет пользователей из кеша аутентификации и отмечает время изменения.
+
+    Access токены, выданные до отметки, больше не собирают пользователя из
+    claims, а проверяются через кеш и базу (например, на is_active).
+    Отметка живет ACCESS_TOKEN_LIFETIME: более старые токены уже истекли.
+    """
+    cache.delete_many([USER_CACHE_KEY.format(user_id) for user_id in user_ids])
+    changed_at = int(time.time())
+    cache.set_many(
+        {USER_CHANGED_KEY.format(user_id): changed_at for user_id in user_ids},
+        api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+    )
+
+
+def blacklist_user_tokens(user_ids):
+    """Отзывает все действующие refresh токены пользователей одним INSERT.
+
+    Выданные access токены остаются действительными до истечения срока.
+    """
+    token_ids = OutstandingToken.objects.filter(
+        user_id__in=user_ids, expires_at__gt=now(), blacklistedtoken__isnull=True
+    ).values_list('id', flat=True)
+    blacklisted = BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id in token_ids], ignore_conflicts=True
+    )
+    return len(blacklisted)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT аутентификация без запроса пользователя на каждый запрос.
+
+    Если токен выдан через /users/login/ и содержит USER_CLAIMS, пользователь
+    собирается из claims без обращения к базе (как JWTStatelessUserAuthentication,
+    но объект - настоящая модель User и годится для ForeignKey и фильтров).
+    Claims не используются, если пользователь изменился после выдачи токена
+    (одна проверка отметки в кеше).
+    Для остальных токенов строка User берется из кеша с TTL
+    JWT_USER_CACHE_TIMEOUT, который сбрасывается при сохранении и деактивации.
+    Без общего кеша (CACHE_SHARED) пользователь всегда читается из базы:
+    отметки об изменениях из других процессов сюда бы не дошли.
+    """
+
+    def get_user(self, validated_token):
+        if not settings.CACHE_SHARED:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        has_claims = all(claim in validated_token for claim in USER_CLAIMS)
+        if has_claims and not self.changed_since_issue(user_id, validated_token):
+            return self.get_user_from_claims(user_id, validated_token)
+        return self.get_cached_user(user_id, validated_token)
+
+    def changed_since_issue(self, user_id, validated_token):
+        # iat в секундах: токен, выданный в ту же секунду, что и изменение, тоже не доверяем
+        changed_at = cache.get(USER_CHANGED_KEY.format(user_id))
+        return changed_at is not None and validated_token.get('iat', 0) <= changed_at
+
+    def get_user_from_claims(self, user_id, validated_token):
+        return self.user_model(
+            **{api_settings.USER_ID_FIELD: user_id},
+            email=validated_token['email'],
+            is_staff=validated_token['is_staff'],
+            is_superuser=validated_token['is_superuser'],
+            is_active=True,
+        )
+
+    def get_cached_user(self, user_id, validated_token):
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+        return user
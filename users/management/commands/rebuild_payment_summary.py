@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management import BaseCommand
+
+from users.reports import rebuild_payment_summary
+
+
+class Command(BaseCommand):
+    """Полный пересчет сводки платежей (или начиная с --since)"""
+    help = 'Пересчитывает таблицу PaymentSummary из платежей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Пересчитать только с этой даты (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = rebuild_payment_summary(since=options['since'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Сводка пересчитана: {created} строк'))
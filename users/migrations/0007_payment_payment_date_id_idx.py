@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+from lms.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # индекс строится CONCURRENTLY, что невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('lms', '0003_subscription'),
+        ('users', '0006_alter_payment_amount'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+        ),
+    ]
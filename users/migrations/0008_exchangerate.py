@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_payment_payment_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True, verbose_name='Валюта')),
+                ('value', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Курс к доллару')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'курс валюты',
+                'verbose_name_plural': 'курсы валют',
+            },
+        ),
+    ]
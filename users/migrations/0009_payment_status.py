@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+def mark_linked_payments_ready(apps, schema_editor):
+    Payment = apps.get_model('users', 'Payment')
+    Payment.objects.filter(link__isnull=False).update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_exchangerate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает ссылку на оплату'), ('ready', 'Ссылка на оплату готова'), ('failed', 'Ошибка создания оплаты')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.RunPython(mark_linked_payments_ready, migrations.RunPython.noop),
+    ]
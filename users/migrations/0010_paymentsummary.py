@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_payment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('course_id', models.PositiveBigIntegerField(default=0, verbose_name='ID курса')),
+                ('lesson_id', models.PositiveBigIntegerField(default=0, verbose_name='ID урока')),
+                ('payment_method', models.CharField(choices=[('cash', 'Наличные'), ('transfer', 'Перевод на счет')], max_length=10, verbose_name='Способ оплаты')),
+                ('total_amount', models.PositiveBigIntegerField(default=0, verbose_name='Сумма платежей')),
+                ('payments_count', models.PositiveIntegerField(default=0, verbose_name='Количество платежей')),
+            ],
+            options={
+                'verbose_name': 'сводка по платежам',
+                'verbose_name_plural': 'сводки по платежам',
+                'constraints': [models.UniqueConstraint(fields=('day', 'course_id', 'lesson_id', 'payment_method'), name='payment_summary_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from lms.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # индексы строятся CONCURRENTLY, что невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('lms', '0004_stripe_product_price'),
+        ('users', '0010_paymentsummary'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['course', 'payment_date', 'id'], name='payment_course_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['lesson', 'payment_date', 'id'], name='payment_lesson_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['payment_method', 'payment_date', 'id'], name='payment_method_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='course',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lms.course', verbose_name='Оплаченный курс'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='lesson',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lms.lesson', verbose_name='Оплаченный урок'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_payment_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
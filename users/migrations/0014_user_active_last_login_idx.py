@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+from lms.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # индексы строятся CONCURRENTLY, что невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0013_avatar_variants'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_login'], name='user_active_last_login_idx'),
+        ),
+    ]
@@ -11,6 +11,7 @@ class User(AbstractUser):
     phone = models.CharField(max_length=35, blank=True, null=True, verbose_name='Телефон')
     city = models.CharField(max_length=50, blank=True, null=True, verbose_name='Город')
     avatar = models.ImageField(upload_to='users/avatars', blank=True, null=True, verbose_name='Аватар')
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Уменьшенные копии аватара')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -19,18 +20,31 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            # поиск неактивных для deactivate_inactive_users
+            models.Index(fields=['last_login'], name='user_active_last_login_idx', condition=models.Q(is_active=True)),
+        ]
 
 class Payment(models.Model):
     PAYMENT_METHODS = [
         ('cash', 'Наличные'),
         ('transfer', 'Перевод на счет'),
     ]
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_PENDING, 'Ожидает ссылку на оплату'),
+        (STATUS_READY, 'Ссылка на оплату готова'),
+        (STATUS_FAILED, 'Ошибка создания оплаты'),
+    ]
 
     user = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        related_name='payments',
         verbose_name='Пользователь'
     )
     payment_date = models.DateField(
@@ -42,6 +56,7 @@ class Payment(models.Model):
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        db_index=False,
         verbose_name='Оплаченный курс'
     )
     lesson = models.ForeignKey(
@@ -49,6 +64,7 @@ class Payment(models.Model):
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        db_index=False,
         verbose_name='Оплаченный урок'
     )
     amount = models.PositiveIntegerField(
@@ -71,10 +87,77 @@ class Payment(models.Model):
         null=True,
         verbose_name='ID сессии'
     )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=STATUS_PENDING,
+        verbose_name='Статус'
+    )
 
     class Meta:
         verbose_name = 'платеж'
         verbose_name_plural = 'платежи'
+        indexes = [
+            # keyset пагинация списка платежей по (-payment_date, -id)
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+            # фильтры PaymentListAPIView с тем же порядком; заменяют индексы FK
+            models.Index(fields=['course', 'payment_date', 'id'], name='payment_course_date_idx'),
+            models.Index(fields=['lesson', 'payment_date', 'id'], name='payment_lesson_date_idx'),
+            models.Index(fields=['payment_method', 'payment_date', 'id'], name='payment_method_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'Платеж {self.user} на сумму {self.amount}'
+
+
+class ExchangeRate(models.Model):
+    currency = models.CharField(
+        max_length=3,
+        unique=True,
+        verbose_name='Валюта'
+    )
+    value = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        verbose_name='Курс к доллару'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'курс валюты'
+        verbose_name_plural = 'курсы валют'
 
     def __str__(self):
-        return f'Платеж {self.user} на сумму {self.amount}'
\ No newline at end of file
+        return f'{self.currency}: {self.value}'
+
+
+
+class PaymentSummary(models.Model):
+    """Выручка и количество готовых (ready) платежей за день по курсу/уроку и способу оплаты.
+
+    course_id и lesson_id хранятся числами (0 - без курса/урока), чтобы
+    ключ был уникальным без NULL и не зависел от удаления курсов.
+    """
+    day = models.DateField(verbose_name='День')
+    course_id = models.PositiveBigIntegerField(default=0, verbose_name='ID курса')
+    lesson_id = models.PositiveBigIntegerField(default=0, verbose_name='ID урока')
+    payment_method = models.CharField(
+        max_length=10,
+        choices=Payment.PAYMENT_METHODS,
+        verbose_name='Способ оплаты'
+    )
+    total_amount = models.PositiveBigIntegerField(default=0, verbose_name='Сумма платежей')
+    payments_count = models.PositiveIntegerField(default=0, verbose_name='Количество платежей')
+
+    class Meta:
+        verbose_name = 'сводка по платежам'
+        verbose_name_plural = 'сводки по платежам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'course_id', 'lesson_id', 'payment_method'],
+                name='payment_summary_key',
+            ),
+        ]
@@ -1,16 +1,18 @@
 from rest_framework import permissions
 
+from users.roles import MODERATOR_GROUP, get_request_roles
+
 class IsModer(permissions.BasePermission):
     """Проверяет, является ли пользователь модератором"""
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Moderator').exists()
+        return MODERATOR_GROUP in get_request_roles(request)
 
 
 class IsOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        if obj.owenr == request.user:
+        if obj.owner_id == request.user.pk:
             return True
         else:
             return False
\ No newline at end of file
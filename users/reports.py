@@ -0,0 +1,73 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from users.models import Payment, PaymentSummary
+
+# Поля платежа, от которых зависит его строка и вклад в сводку
+SUMMARY_FIELDS = ('status', 'payment_date', 'course', 'lesson', 'payment_method', 'amount')
+
+
+def change_payment_summary(payment, sign=1):
+    """Прибавляет (sign=1) или вычитает (sign=-1) платеж в дневной сводке одним UPDATE.
+
+    Строка для нового ключа создается INSERT; вычитание строку не создает.
+    """
+    key = {
+        'day': payment.payment_date,
+        'course_id': payment.course_id or 0,
+        'lesson_id': payment.lesson_id or 0,
+        'payment_method': payment.payment_method,
+    }
+    increment = {
+        'total_amount': F('total_amount') + sign * payment.amount,
+        'payments_count': F('payments_count') + sign,
+    }
+    if PaymentSummary.objects.filter(**key).update(**increment) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            PaymentSummary.objects.create(**key, total_amount=payment.amount, payments_count=1)
+    except IntegrityError:
+        # строку успел создать параллельный запрос
+        PaymentSummary.objects.filter(**key).update(**increment)
+
+
+def rebuild_payment_summary(since=None, batch_size=1000):
+    """Пересчитывает сводку из готовых платежей целиком или начиная с дня since."""
+    payments = Payment.objects.filter(status=Payment.STATUS_READY)
+    summaries = PaymentSummary.objects.all()
+    if since is not None:
+        payments = payments.filter(payment_date__gte=since)
+        summaries = summaries.filter(day__gte=since)
+
+    rows = (
+        payments
+        .values('payment_date', 'payment_method')
+        .annotate(
+            course=Coalesce('course_id', Value(0)),
+            lesson=Coalesce('lesson_id', Value(0)),
+        )
+        .values('payment_date', 'payment_method', 'course', 'lesson')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+    created = 0
+    with transaction.atomic():
+        summaries.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(PaymentSummary(
+                day=row['payment_date'],
+                course_id=row['course'],
+                lesson_id=row['lesson'],
+                payment_method=row['payment_method'],
+                total_amount=row['total'],
+                payments_count=row['count'],
+            ))
+            if len(batch) >= batch_size:
+                created += len(PaymentSummary.objects.bulk_create(batch))
+                batch = []
+        created += len(PaymentSummary.objects.bulk_create(batch))
+    return created
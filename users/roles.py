@@ -0,0 +1,26 @@
+MODERATOR_GROUP = 'Moderator'
+
+
+def get_user_roles(user):
+    """Возвращает названия групп пользователя одним запросом."""
+    if not user.is_authenticated:
+        return frozenset()
+    return frozenset(user.groups.values_list('name', flat=True))
+
+
+def get_request_roles(request):
+    """Роли текущего запроса.
+
+    Сначала берем claim `roles` из JWT, если его нет - один раз читаем группы
+    из базы и запоминаем на объекте запроса, чтобы составные права не
+    повторяли запрос.
+    """
+    roles = getattr(request, '_user_roles', None)
+    if roles is None:
+        token = getattr(request, 'auth', None)
+        if token is not None and 'roles' in token:
+            roles = frozenset(token['roles'])
+        else:
+            roles = get_user_roles(request.user)
+        request._user_roles = roles
+    return roles
@@ -1,20 +1,94 @@
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
-from users.models import Payment, User
+from config.metrics import TimedSerializerMixin
+from lms.serializers import ImageVariantsField
+from users.models import Payment, PaymentSummary, User
+from users.roles import get_user_roles
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
+        read_only_fields = ('link', 'session_id', 'status')
 
-class UserSerializer(serializers.ModelSerializer):
-    payments = PaymentSerializer(many=True, read_only=True)
+
+class PaymentStatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Короткий ответ для опроса статуса платежа"""
+
+    class Meta:
+        model = Payment
+        fields = ('id', 'status', 'link')
+
+class PaymentSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PaymentSummary
+        fields = ('day', 'course_id', 'lesson_id', 'payment_method', 'total_amount', 'payments_count')
+
+
+class UserPaymentSerializer(serializers.ModelSerializer):
+    """Платеж внутри списка пользователей"""
+
+    class Meta:
+        model = Payment
+        fields = ('id', 'payment_date', 'course', 'lesson', 'amount', 'payment_method', 'status')
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    payments = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
+
+    # Колонки платежа, которые нужны для вложенного списка
+    payment_fields = ('id', 'user_id', 'payment_date', 'course_id', 'lesson_id', 'amount', 'payment_method', 'status')
 
     class Meta:
         model = User
-        fields = ("id", "email", "first_name", "last_name", "payments")
+        fields = ("id", "email", "first_name", "last_name", "avatar", "avatar_variants", "payments")
+
+    def get_payments(self, user):
+        """Берем платежи, заранее загруженные во view (prefetch с to_attr)."""
+        payments = getattr(user, 'prefetched_payments', None)
+        if payments is None:
+            payments = user.payments.only(*self.payment_fields).order_by('-payment_date', '-id')
+        return UserPaymentSerializer(payments, many=True, context=self.context).data
+
+
+def set_user_claims(access, user):
+    """Пишет в access токен роли и данные пользователя, чтобы не ходить в базу.
+
+    В refresh токен claims не попадают: иначе /token/refresh/ копировал бы
+    их в каждый новый access токен на весь REFRESH_TOKEN_LIFETIME.
+    """
+    access['roles'] = sorted(get_user_roles(user))
+    access['email'] = user.email
+    access['is_staff'] = user.is_staff
+    access['is_superuser'] = user.is_superuser
+    return access
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Логин: claims пользователя только в access токене"""
 
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data['access'] = str(set_user_claims(AccessToken(data['access']), self.user))
+        return data
 
 
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление access токена: роли и данные пользователя перечитываются из базы,
+    так что устаревают не дольше ACCESS_TOKEN_LIFETIME; неактивный пользователь
+    новый токен не получает"""
 
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed('Пользователь не найден или неактивен', code='no_active_account')
+        data['access'] = str(set_user_claims(access, user))
+        return data
@@ -1,37 +1,123 @@
+from decimal import Decimal
+
 import requests
 import stripe
-from rest_framework import status
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import APIException
 
+from config.metrics import TimedSession
 from config.settings import CURRENCY_API_KEY, STRIPE_API_KEY
+from users.models import ExchangeRate, Payment
 
 stripe.api_key = STRIPE_API_KEY
+if settings.STRIPE_API_BASE:
+    # например, локальный stripe-mock для тестов
+    stripe.api_base = settings.STRIPE_API_BASE
 CURRENCY_API_KEY = CURRENCY_API_KEY
 
+# Общая сессия с пулом соединений для всех внешних API
+http_session = TimedSession()
+http_session.mount('https://', HTTPAdapter(pool_maxsize=settings.HTTP_POOL_MAXSIZE))
+stripe.default_http_client = stripe.RequestsClient(timeout=settings.EXTERNAL_API_TIMEOUT, session=http_session)
 
-def convert_rub_to_usd(amount):
-    usd_price = 90
-    response = requests.get(
-        f"https://api.currencyapi.com/v3/latest?apikey={CURRENCY_API_KEY}&currencies=RUB"
+EXCHANGE_RATE_CACHE_KEY = 'exchange-rate:{}'
+
+
+class ExchangeRateUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Курс валюты временно недоступен'
+    default_code = 'exchange_rate_unavailable'
+
+
+class CurrencyApiProvider:
+    """Курс валюты к доллару из currencyapi.com"""
+    url = 'https://api.currencyapi.com/v3/latest'
+
+    def get_rate(self, currency):
+        response = http_session.get(
+            self.url,
+            params={'apikey': CURRENCY_API_KEY, 'currencies': currency},
+            timeout=settings.EXTERNAL_API_TIMEOUT,
+        )
+        response.raise_for_status()
+        return Decimal(str(response.json()['data'][currency]['value']))
+
+
+def refresh_exchange_rate(currency='RUB'):
+    """Запрашивает курс у провайдера и сохраняет в базу и кеш."""
+    provider = import_string(settings.EXCHANGE_RATE_PROVIDER)()
+    rate, _ = ExchangeRate.objects.update_or_create(
+        currency=currency, defaults={'value': provider.get_rate(currency)}
     )
-    if response.status_code == status.HTTP_200_OK:
-        usd_price = amount / response.json()["data"]["RUB"]["value"]
-    return int(usd_price)
+    cache.set(EXCHANGE_RATE_CACHE_KEY.format(currency), rate.value, settings.EXCHANGE_RATE_CACHE_TIMEOUT)
+    return rate.value
+
 
+def get_exchange_rate(currency='RUB'):
+    """Курс из кеша, затем из базы; к провайдеру идем только при пустой базе."""
+    key = EXCHANGE_RATE_CACHE_KEY.format(currency)
+    value = cache.get(key)
+    if value is not None:
+        return value
 
-def create_stripe_price(amount, name):
-    product = stripe.Product.create(name=name)
+    value = ExchangeRate.objects.filter(currency=currency).values_list('value', flat=True).first()
+    if value is None:
+        try:
+            return refresh_exchange_rate(currency)
+        except (requests.RequestException, KeyError, ValueError):
+            raise ExchangeRateUnavailable()
+    cache.set(key, value, settings.EXCHANGE_RATE_CACHE_TIMEOUT)
+    return value
+
+
+def convert_rub_to_usd(amount):
+    return int(amount / get_exchange_rate('RUB'))
+
+
+def get_stripe_price(item, amount, currency='usd'):
+    """Возвращает ID цены Stripe для курса или урока.
+
+    Продукт и цена создаются один раз и переиспользуются, пока сумма и
+    валюта совпадают с сохраненным отпечатком.
+    """
+    unit_amount = amount * 100
+    fingerprint = f'{currency}:{unit_amount}'
+    if item.stripe_price_id and item.stripe_price_fingerprint == fingerprint:
+        return item.stripe_price_id
+
+    if not item.stripe_product_id:
+        item.stripe_product_id = stripe.Product.create(name=item.title).id
     price = stripe.Price.create(
-        currency="usd",
-        unit_amount=amount * 100,
-        product=product.id,
+        currency=currency,
+        unit_amount=unit_amount,
+        product=item.stripe_product_id,
+    )
+    item.stripe_price_id = price.id
+    item.stripe_price_fingerprint = fingerprint
+    type(item).objects.filter(pk=item.pk).update(
+        stripe_product_id=item.stripe_product_id,
+        stripe_price_id=item.stripe_price_id,
+        stripe_price_fingerprint=fingerprint,
     )
-    return price
+    return price.id
 
 
-def create_stripe_session(price):
+def create_stripe_session(price_id):
     session = stripe.checkout.Session.create(
         success_url="http://localhost:8000/",
-        line_items=[{"price": price.id, "quantity": 1}],
+        line_items=[{"price": price_id, "quantity": 1}],
         mode="payment",
     )
-    return session.get("id"), session.get("url")
\ No newline at end of file
+    return session.get("id"), session.get("url")
+
+
+def fill_payment_session(payment):
+    """Создает сессию Stripe для платежа и сохраняет ссылку на оплату."""
+    amount_in_usd = convert_rub_to_usd(payment.amount)
+    price_id = get_stripe_price(payment.course or payment.lesson, amount_in_usd)
+    payment.session_id, payment.link = create_stripe_session(price_id)
+    payment.status = Payment.STATUS_READY
+    payment.save(update_fields=['session_id', 'link', 'status'])
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from lms.signals import queue_image_variants
+from users.authentication import invalidate_cached_users
+from users.models import Payment, User
+from users.reports import SUMMARY_FIELDS, change_payment_summary
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Сбрасываем закешированного пользователя при любом изменении."""
+    invalidate_cached_users([instance.pk])
+
+
+@receiver(pre_save, sender=Payment)
+def remember_summary_state(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Запоминаем сохраненное состояние платежа, если save может изменить его вклад в сводку."""
+    instance._summary_before = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(SUMMARY_FIELDS) & {name.removesuffix('_id') for name in update_fields}:
+        return
+    instance._summary_before = Payment.objects.filter(pk=instance.pk).only(*SUMMARY_FIELDS).first()
+
+
+@receiver(post_save, sender=Payment)
+def update_payment_summary(sender, instance, created, raw=False, **kwargs):
+    """В сводке только готовые (ready) платежи: учитываем переход в ready и из него."""
+    if raw:
+        return
+    before = getattr(instance, '_summary_before', None)
+    if before is not None and before.status == Payment.STATUS_READY:
+        change_payment_summary(before, -1)
+    if instance.status == Payment.STATUS_READY and (created or before is not None):
+        change_payment_summary(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def remove_payment_from_summary(sender, instance, **kwargs):
+    if instance.status == Payment.STATUS_READY:
+        change_payment_summary(instance, -1)
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, **kwargs):
+    queue_image_variants(instance, 'avatar')
@@ -0,0 +1,33 @@
+import stripe
+from celery import shared_task
+
+from users.models import Payment
+from users.services import ExchangeRateUnavailable, fill_payment_session, refresh_exchange_rate
+
+
+@shared_task
+def refresh_exchange_rates():
+    """Обновляет курс рубля в базе и кеше для convert_rub_to_usd."""
+    return str(refresh_exchange_rate('RUB'))
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def create_payment_session(self, payment_id):
+    """Заполняет session_id и link платежа, созданного в статусе pending."""
+    payment = Payment.objects.select_related('course', 'lesson').filter(
+        pk=payment_id, status=Payment.STATUS_PENDING
+    ).first()
+    if payment is None:
+        return
+    try:
+        fill_payment_session(payment)
+    except (stripe.StripeError, ExchangeRateUnavailable) as exc:
+        if self.request.retries >= self.max_retries:
+            Payment.objects.filter(pk=payment_id).update(status=Payment.STATUS_FAILED)
+            return
+        raise self.retry(exc=exc)
+    except Exception:
+        # повтор не поможет (например, курс платежа удален), а pending
+        # заставил бы клиента опрашивать статус бесконечно
+        Payment.objects.filter(pk=payment_id, status=Payment.STATUS_PENDING).update(status=Payment.STATUS_FAILED)
+        raise
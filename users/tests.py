@@ -1,3 +1,703 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from itertools import combinations
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django_filters.rest_framework import DjangoFilterBackend
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from lms.benchmarks import stub_external_apis
+from lms.models import Course, Lesson
+from lms.tasks import deactivate_inactive_users
+from users.models import ExchangeRate, Payment, PaymentSummary, User
+from users.services import ExchangeRateUnavailable, convert_rub_to_usd
+from users.tasks import create_payment_session, refresh_exchange_rates
+from users.views import PaymentListAPIView
+
+
+@override_settings(CACHE_SHARED=True)
+class ModeratorRoleTest(APITestCase):
+    def setUp(self):
+        self.moderator_group = Group.objects.create(name="Moderator")
+        self.moderator_user = User.objects.create(email="moderator@test.com")
+        self.moderator_user.set_password("12345678")
+        self.moderator_user.save()
+        self.moderator_user.groups.add(self.moderator_group)
+        self.course = Course.objects.create(title="Test Course")
+        self.client = APIClient()
+        cache.clear()  # токены тестов выданы после создания пользователя
+
+    def login(self, token="access"):
+        response = self.client.post(
+            "/users/login/", {"email": "moderator@test.com", "password": "12345678"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data[token]
+
+    def test_login_token_contains_roles(self):
+        """
+        Проверяет, что access токен содержит роли пользователя.
+        """
+        token = AccessToken(self.login())
+        self.assertEqual(token["roles"], ["Moderator"])
+
+    def test_refresh_recomputes_roles(self):
+        """
+        Проверяет, что роли есть только в access токене и перечитываются при его обновлении.
+        """
+        refresh = self.login("refresh")
+        self.assertNotIn("roles", RefreshToken(refresh))
+
+        self.moderator_user.groups.remove(self.moderator_group)
+        response = self.client.post("/users/token/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data["access"])["roles"], [])
+
+    def test_permissions_use_token_roles(self):
+        """
+        Проверяет, что проверка IsModer не обращается к группам в базе.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()}")
+        # курс (и updated_at для ETag), уроки
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/lms/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHE_SHARED=True)
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@test.com", is_active=True)
+        self.user.set_password("12345678")
+        self.user.save()
+        Course.objects.create(title="Test Course")
+        self.client = APIClient()
+        cache.clear()  # токены тестов выданы после создания пользователя
+
+    def login(self):
+        response = self.client.post("/users/login/", {"email": "user@test.com", "password": "12345678"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_login_token_authenticates_without_queries(self):
+        """
+        Проверяет, что пользователь из токена логина собирается без запроса к базе.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        # только список курсов
+        with self.assertNumQueries(1):
+            response = self.client.get("/lms/course/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_cached_and_invalidated_on_save(self):
+        """
+        Проверяет, что пользователь берется из кеша и сбрасывается при сохранении.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        with self.assertNumQueries(2):
+            self.client.get("/lms/course/")
+        with self.assertNumQueries(1):
+            self.client.get("/lms/course/")
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get("/lms/course/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected_with_login_token(self):
+        """
+        Проверяет, что после деактивации токены логина перестают работать, в том числе refresh.
+        """
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get("/lms/course/").status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/lms/course/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        response = self.client.post("/users/token/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_without_shared_cache_user_read_from_database(self):
+        """
+        Проверяет, что без общего кеша деактивация в другом процессе (без отметки
+        в кеше этого процесса) сразу отключает токен логина.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        with self.assertNumQueries(2):
+            self.client.get("/lms/course/")
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get("/lms/course/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_issued_after_change_uses_claims(self):
+        """
+        Проверяет, что токен, выданный после изменения пользователя, снова собирается из claims.
+        """
+        with patch("users.authentication.time.time", return_value=time.time() - 10):
+            self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        with self.assertNumQueries(1):
+            response = self.client.get("/lms/course/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivate_inactive_users_invalidates_cache(self):
+        """
+        Проверяет, что задача деактивации сбрасывает кеш пользователей.
+        """
+        User.objects.filter(pk=self.user.pk).update(last_login=now() - timedelta(days=31))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.client.get("/lms/course/")
+
+        deactivate_inactive_users()
+
+        response = self.client.get("/lms/course/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DeactivateInactiveUsersTest(APITestCase):
+    def setUp(self):
+        self.inactive = User.objects.bulk_create(
+            User(email=f"old{i}@test.com", last_login=now() - timedelta(days=31 + i % 2)) for i in range(5)
+        )
+        self.active = User.objects.create(email="recent@test.com", last_login=now() - timedelta(days=1))
+        self.refresh = RefreshToken.for_user(self.inactive[0])
+        RefreshToken.for_user(self.active)
+
+    def test_deactivates_in_batches_and_revokes_tokens(self):
+        """
+        Проверяет деактивацию пачками, подсчет и отзыв refresh токенов.
+        """
+        self.assertEqual(deactivate_inactive_users(batch_size=2), {"processed": 5, "revoked_tokens": 1})
+        self.assertFalse(User.objects.filter(pk__in=[user.pk for user in self.inactive], is_active=True).exists())
+        self.active.refresh_from_db()
+        self.assertTrue(self.active.is_active)
+
+        response = self.client.post("/users/token/refresh/", {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(deactivate_inactive_users(), {"processed": 0, "revoked_tokens": 0})
+
+    @skipUnless(connection.vendor == "postgresql", "План запроса проверяется на PostgreSQL")
+    def test_batch_uses_partial_index(self):
+        """
+        Проверяет, что выборка пачки идет по частичному индексу last_login.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = User.objects.filter(
+            last_login__lt=now() - timedelta(days=30), is_active=True
+        ).order_by("last_login", "id").values_list("id", "last_login")[:2].explain()
+        self.assertIn("user_active_last_login_idx", plan)
+
+
+class PaymentPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="payer@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.payments = Payment.objects.bulk_create(
+            Payment(user=self.user, amount=100, payment_method="cash") for _ in range(7)
+        )
+        # несколько платежей за один день - проверяем разрешение ничьих по id
+        Payment.objects.filter(pk__in=[p.pk for p in self.payments[:3]]).update(payment_date=date(2024, 1, 2))
+        Payment.objects.filter(pk__in=[p.pk for p in self.payments[3:]]).update(payment_date=date(2024, 1, 1))
+
+    def test_payments_keyset_by_date_and_id(self):
+        """
+        Проверяет порядок (-payment_date, -id) и отсутствие дублей между страницами.
+        """
+        response = self.client.get("/users/payments/", {"page_size": 2})
+        ids = [item["id"] for item in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [item["id"] for item in response.data["results"]]
+        expected = [p.pk for p in self.payments[2::-1]] + [p.pk for p in self.payments[:2:-1]]
+        self.assertEqual(ids, expected)
+
+    def test_cursor_with_wrong_value_types(self):
+        """
+        Проверяет, что курсор правильной формы, но с неверными значениями дает 404.
+        """
+        for position in (["abc", 1], ["2024-01-01", "x"], [None, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            response = self.client.get("/users/payments/", {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+
+class StubExchangeRateProvider:
+    """Локальный провайдер курса для тестов"""
+    calls = 0
+    rate = Decimal("100")
+
+    def get_rate(self, currency):
+        StubExchangeRateProvider.calls += 1
+        return self.rate
+
+
+class BrokenExchangeRateProvider:
+    def get_rate(self, currency):
+        raise requests.ConnectionError()
+
+
+@override_settings(EXCHANGE_RATE_PROVIDER="users.tests.StubExchangeRateProvider")
+class ExchangeRateTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        StubExchangeRateProvider.calls = 0
+
+    def test_convert_reads_rate_from_cache(self):
+        """
+        Проверяет, что после обновления задачей конвертация не ходит ни в базу, ни в сеть.
+        """
+        refresh_exchange_rates()
+        self.assertEqual(ExchangeRate.objects.get(currency="RUB").value, Decimal("100"))
+        with self.assertNumQueries(0):
+            self.assertEqual(convert_rub_to_usd(5000), 50)
+        self.assertEqual(StubExchangeRateProvider.calls, 1)
+
+    def test_convert_falls_back_to_database(self):
+        """
+        Проверяет, что при пустом кеше курс берется из базы без запроса к провайдеру.
+        """
+        ExchangeRate.objects.create(currency="RUB", value=Decimal("80"))
+        self.assertEqual(convert_rub_to_usd(800), 10)
+        self.assertEqual(StubExchangeRateProvider.calls, 0)
+
+    @override_settings(EXCHANGE_RATE_PROVIDER="users.tests.BrokenExchangeRateProvider")
+    def test_convert_without_rate(self):
+        """
+        Проверяет, что без курса возвращается ошибка вместо выдуманного значения.
+        """
+        with self.assertRaises(ExchangeRateUnavailable):
+            convert_rub_to_usd(800)
+
+
+@override_settings(EXCHANGE_RATE_PROVIDER="users.tests.StubExchangeRateProvider", PAYMENT_CREATE_ASYNC=False)
+class PaymentStripePriceTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="buyer@test.com")
+        self.course = Course.objects.create(title="Paid Course")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def pay(self, amount):
+        return self.client.post(
+            "/users/payment/create/",
+            {"course": self.course.id, "amount": amount, "payment_method": "transfer"},
+        )
+
+    @patch("users.services.stripe")
+    def test_price_reused_while_amount_matches(self, stripe_mock):
+        """
+        Проверяет, что продукт и цена Stripe создаются один раз на курс и сумму.
+        """
+        stripe_mock.Product.create.return_value = MagicMock(id="prod_1")
+        stripe_mock.Price.create.side_effect = [MagicMock(id="price_1"), MagicMock(id="price_2")]
+        stripe_mock.checkout.Session.create.return_value = {"id": "cs_1", "url": "https://stripe.test/cs_1"}
+
+        self.assertEqual(self.pay(10000).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.pay(10000).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(stripe_mock.Product.create.call_count, 1)
+        self.assertEqual(stripe_mock.Price.create.call_count, 1)
+        self.assertEqual(stripe_mock.checkout.Session.create.call_count, 2)
+
+        self.assertEqual(self.pay(20000).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(stripe_mock.Product.create.call_count, 1)
+        self.assertEqual(stripe_mock.Price.create.call_count, 2)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.stripe_price_id, "price_2")
+        self.assertEqual(self.course.stripe_price_fingerprint, "usd:20000")
+
+    def test_payment_requires_course_or_lesson(self):
+        """
+        Проверяет, что платеж без курса и урока не создается.
+        """
+        response = self.client.post("/users/payment/create/", {"amount": 100, "payment_method": "cash"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+
+    @skipUnless(os.getenv("STRIPE_API_BASE"), "stripe-mock не запущен")
+    def test_checkout_against_stripe_mock(self):
+        """
+        Проверяет оплату против stripe-mock: STRIPE_API_BASE=http://localhost:12111, STRIPE_API_KEY=sk_test_123.
+        """
+        response = self.pay(10000)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Payment.objects.get().session_id)
+
+
+@override_settings(EXCHANGE_RATE_PROVIDER="users.tests.StubExchangeRateProvider", PAYMENT_CREATE_ASYNC=True)
+class AsyncPaymentTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="buyer@test.com")
+        self.course = Course.objects.create(title="Paid Course")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @patch("users.services.stripe")
+    def test_payment_created_pending_and_filled_by_task(self, stripe_mock):
+        """
+        Проверяет, что платеж создается в статусе pending, а ссылку заполняет задача.
+        """
+        stripe_mock.Product.create.return_value = MagicMock(id="prod_1")
+        stripe_mock.Price.create.return_value = MagicMock(id="price_1")
+        stripe_mock.checkout.Session.create.return_value = {"id": "cs_1", "url": "https://stripe.test/cs_1"}
+
+        with patch("users.views.create_payment_session.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/users/payment/create/",
+                    {"course": self.course.id, "amount": 10000, "payment_method": "transfer"},
+                )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], Payment.STATUS_PENDING)
+        stripe_mock.checkout.Session.create.assert_not_called()
+        delay.assert_called_once_with(response.data["id"])
+
+        payment_id = response.data["id"]
+        response = self.client.get(f"/users/payment/{payment_id}/status")
+        self.assertEqual(response.data["status"], Payment.STATUS_PENDING)
+        self.assertEqual(response["Retry-After"], "1")
+
+        create_payment_session(payment_id)
+
+        response = self.client.get(f"/users/payment/{payment_id}/status")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Payment.STATUS_READY)
+        self.assertEqual(response.data["link"], "https://stripe.test/cs_1")
+        self.assertNotIn("Retry-After", response)
+
+    def test_unexpected_error_fails_payment(self):
+        """
+        Проверяет, что непредвиденная ошибка задачи переводит платеж в failed, и опрос статуса прекращается.
+        """
+        payment = Payment.objects.create(user=self.user, amount=100, payment_method="cash")
+        with patch("users.tasks.fill_payment_session", side_effect=AttributeError):
+            with self.assertRaises(AttributeError):
+                create_payment_session(payment.id)
+
+        response = self.client.get(f"/users/payment/{payment.id}/status")
+        self.assertEqual(response.data["status"], Payment.STATUS_FAILED)
+        self.assertNotIn("Retry-After", response)
+
+    def test_status_of_foreign_payment(self):
+        """
+        Проверяет, что статус чужого платежа недоступен.
+        """
+        other = User.objects.create(email="other@test.com")
+        payment = Payment.objects.create(user=other, course=self.course, amount=100, payment_method="cash")
+        response = self.client.get(f"/users/payment/{payment.id}/status")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PaymentSummaryTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="buyer@test.com")
+        self.admin = User.objects.create(email="admin@test.com", is_staff=True)
+        self.course = Course.objects.create(title="Paid Course")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def create_payments(self):
+        ready = Payment.STATUS_READY
+        Payment.objects.create(user=self.user, course=self.course, amount=100, payment_method="cash", status=ready)
+        Payment.objects.create(user=self.user, course=self.course, amount=250, payment_method="cash", status=ready)
+        Payment.objects.create(user=self.user, amount=40, payment_method="transfer", status=ready)
+        # не оплачены - в сводку не попадают
+        Payment.objects.create(user=self.user, amount=70, payment_method="transfer")
+        Payment.objects.create(user=self.user, amount=80, payment_method="cash", status=Payment.STATUS_FAILED)
+
+    def summary(self):
+        return sorted(
+            PaymentSummary.objects.values_list("course_id", "payment_method", "total_amount", "payments_count")
+        )
+
+    def test_summary_updated_on_payment_create(self):
+        """
+        Проверяет, что сводка обновляется при создании платежей.
+        """
+        self.create_payments()
+        self.assertEqual(self.summary(), [(0, "transfer", 40, 1), (self.course.id, "cash", 350, 2)])
+
+    def test_summary_follows_status_and_delete(self):
+        """
+        Проверяет, что платеж попадает в сводку при переходе в ready и уходит при удалении.
+        """
+        payment = Payment.objects.create(user=self.user, course=self.course, amount=100, payment_method="cash")
+        self.assertEqual(self.summary(), [])
+
+        payment.status = Payment.STATUS_READY
+        payment.save(update_fields=["status"])
+        payment.save()
+        self.assertEqual(self.summary(), [(self.course.id, "cash", 100, 1)])
+
+        payment.delete()
+        self.assertEqual(self.summary(), [(self.course.id, "cash", 0, 0)])
+
+    def test_rebuild_command(self):
+        """
+        Проверяет, что полный пересчет дает ту же сводку.
+        """
+        self.create_payments()
+        expected = self.summary()
+        PaymentSummary.objects.all().delete()
+        call_command("rebuild_payment_summary", stdout=StringIO())
+        self.assertEqual(self.summary(), expected)
+
+    def test_report_endpoint_filters(self):
+        """
+        Проверяет отчет с фильтрами по датам без обращения к таблице платежей.
+        """
+        self.create_payments()
+        PaymentSummary.objects.create(day=date(2020, 1, 1), payment_method="cash", total_amount=1, payments_count=1)
+        today = now().date().isoformat()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/users/payments/summary/", {"day__gte": today, "payment_method": "cash"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["total_amount"], 350)
+        self.assertFalse(any("users_payment\"" in query["sql"] for query in queries))
+
+    def test_report_requires_staff(self):
+        """
+        Проверяет, что отчет недоступен обычному пользователю.
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/users/payments/summary/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN проверяется только на PostgreSQL")
+class PaymentQueryPlanTest(APITestCase):
+    """
+    Для каждой комбинации фильтров PaymentListAPIView строит план запроса
+    страницы и падает, если по users_payment остался Seq Scan или Sort.
+    Seq scan и sort выключены в планировщике: если они все равно есть,
+    подходящего индекса нет.
+    """
+
+    def setUp(self):
+        user = User.objects.create(email="buyer@test.com")
+        course = Course.objects.create(title="Course")
+        self.values = {
+            "course": course.id,
+            "lesson": Lesson.objects.create(title="Lesson", course=course).id,
+            "payment_method": "cash",
+        }
+        Payment.objects.create(user=user, course=course, amount=100, payment_method="cash")
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+
+    def get_page_queryset(self, params):
+        view = PaymentListAPIView()
+        view.request = Request(APIRequestFactory().get("/users/payments/", params))
+        queryset = DjangoFilterBackend().filter_queryset(view.request, view.get_queryset(), view)
+        return queryset.order_by(*view.keyset_ordering)[:6]
+
+    def find_bad_nodes(self, plan):
+        bad = []
+        if plan["Node Type"] == "Sort" or (
+            plan["Node Type"] == "Seq Scan" and plan.get("Relation Name") == Payment._meta.db_table
+        ):
+            bad.append(plan["Node Type"])
+        for child in plan.get("Plans", []):
+            bad += self.find_bad_nodes(child)
+        return bad
+
+    def test_filter_combinations_use_indexes(self):
+        fields = PaymentListAPIView.filterset_fields
+        for size in range(len(fields) + 1):
+            for combination in combinations(fields, size):
+                with self.subTest(filters=combination):
+                    queryset = self.get_page_queryset({field: self.values[field] for field in combination})
+                    plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                    self.assertEqual(self.find_bad_nodes(plan), [], json.dumps(plan, indent=2))
+
+
+class ExportTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create(email="admin@test.com", is_staff=True)
+        self.course = Course.objects.create(title="Course")
+        Payment.objects.create(user=self.admin, course=self.course, amount=100, payment_method="cash")
+        Payment.objects.create(user=self.admin, amount=200, payment_method="transfer")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_payments_csv_with_filters(self):
+        """
+        Проверяет CSV выгрузку платежей с фильтром списка платежей.
+        """
+        response = self.client.get("/users/payments/export/", {"payment_method": "cash"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "user_id", "payment_date"])
+        self.assertEqual(len(lines), 2)
+        self.assertIn(",100,cash,", lines[1])
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_users_ndjson(self):
+        """
+        Проверяет NDJSON выгрузку пользователей.
+        """
+        User.objects.create(email="user@test.com")
+        response = self.client.get("/users/export/", {"export_format": "ndjson"})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row["email"] for row in rows], ["admin@test.com", "user@test.com"])
+
+    def test_export_requires_staff(self):
+        """
+        Проверяет, что выгрузка недоступна обычному пользователю.
+        """
+        self.client.force_authenticate(user=User.objects.create(email="user@test.com"))
+        response = self.client.get("/users/payments/export/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class UserListTest(APITestCase):
+    def setUp(self):
+        self.users = User.objects.bulk_create(User(email=f"user{i}@test.com") for i in range(6))
+        for user in self.users:
+            Payment.objects.bulk_create(
+                Payment(user=user, amount=amount, payment_method="cash") for amount in (100, 200, 300)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_user_list_paginated_with_prefetched_payments(self):
+        """
+        Проверяет, что список пользователей постраничный и платежи грузятся одним запросом.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get("/users/", {"page_size": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["next"])
+        self.assertEqual(len(response.data["results"][0]["payments"]), 3)
+
+    def test_payments_limit(self):
+        """
+        Проверяет, что ?payments_limit= оставляет только последние платежи каждого пользователя.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get("/users/", {"page_size": 5, "payments_limit": 2})
+        for user in response.data["results"]:
+            self.assertEqual([payment["amount"] for payment in user["payments"]], [300, 200])
+
+    def test_invalid_payments_limit(self):
+        """
+        Проверяет, что некорректный payments_limit возвращает ошибку валидации.
+        """
+        for limit in ("abc", "0", "²", str(2 ** 63)):
+            response = self.client.get("/users/", {"payments_limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, limit)
+
+    def test_avatar_variants_urls(self):
+        """
+        Проверяет, что в списке пользователей отдаются URL уменьшенных копий аватара.
+        """
+        User.objects.filter(pk=self.users[0].pk).update(
+            avatar="users/avatars/me.png",
+            avatar_variants={"source": "users/avatars/me.png", "thumb": {"webp": "users/avatars/variants/me_thumb.webp"}},
+        )
+        response = self.client.get("/users/", {"page_size": 5})
+        results = {user["id"]: user for user in response.data["results"]}
+        self.assertEqual(
+            results[self.users[0].pk]["avatar_variants"],
+            {"thumb": {"webp": "http://testserver/media/users/avatars/variants/me_thumb.webp"}},
+        )
+        self.assertEqual(results[self.users[1].pk]["avatar_variants"], {})
+
+
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="metrics@test.com")
+        self.course = Course.objects.create(title="Course")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get_server_timing(self, response):
+        return {
+            name: float(dur.split("=")[1])
+            for name, dur, *_ in (part.split(";") for part in response["Server-Timing"].split(", "))
+        }
+
+    def test_server_timing_header(self):
+        """
+        Проверяет, что заголовок Server-Timing содержит число запросов и время по этапам.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/lms/course/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+        timings = self.get_server_timing(response)
+        self.assertEqual(set(timings), {"db", "serialize", "external", "total"})
+        self.assertGreater(timings["total"], 0)
+        self.assertEqual(timings["external"], 0)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_external_calls_and_metrics_endpoint(self):
+        """
+        Проверяет учет запросов к внешним API и гистограммы на /metrics.
+        """
+        with stub_external_apis():
+            response = self.client.post(
+                "/users/payment/create/",
+                {"course": self.course.id, "amount": 10000, "payment_method": "transfer"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(self.get_server_timing(response)["external"], 0)
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="POST",status="201",view="users:payment-create"}', body)
+        self.assertIn('http_request_db_queries_count{view="users:payment-create"}', body)
+        self.assertIn('http_request_external_duration_seconds_count{view="users:payment-create"}', body)
+        self.assertIn('external_call_duration_seconds_count{host="127.0.0.1"}', body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        """
+        Проверяет, что при заданном METRICS_TOKEN /metrics требует токен.
+        """
+        self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token_only_in_debug(self):
+        """
+        Проверяет, что без METRICS_TOKEN /metrics закрыт, если DEBUG выключен.
+        """
+        with override_settings(DEBUG=False):
+            self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, status.HTTP_200_OK)
@@ -3,15 +3,26 @@ from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from users.apps import UsersConfig
-from users.views import PaymentListAPIView, UserCreateAPIView, UserListAPIView, PaymentCreateAPIView
+from users.serializers import UserTokenObtainPairSerializer, UserTokenRefreshSerializer
+from users.views import PaymentListAPIView, UserCreateAPIView, UserListAPIView, PaymentCreateAPIView, \
+    PaymentStatusAPIView, PaymentSummaryListAPIView, PaymentExportAPIView, UserExportAPIView
 
 app_name = UsersConfig.name
 
 urlpatterns = [
     path('register/', UserCreateAPIView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(permission_classes=(AllowAny,)), name='login'),
+    path('login/', TokenObtainPairView.as_view(
+        serializer_class=UserTokenObtainPairSerializer,
+        permission_classes=(AllowAny,)
+    ), name='login'),
     path('', UserListAPIView.as_view(), name='users'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('export/', UserExportAPIView.as_view(), name='user-export'),
+    path('token/refresh/', TokenRefreshView.as_view(
+        serializer_class=UserTokenRefreshSerializer
+    ), name='token_refresh'),
     path("payments/", PaymentListAPIView.as_view(), name="payment-list"),
+    path("payments/summary/", PaymentSummaryListAPIView.as_view(), name="payment-summary"),
+    path("payments/export/", PaymentExportAPIView.as_view(), name="payment-export"),
     path("payment/create/", PaymentCreateAPIView.as_view(), name="payment-create"),
+    path("payment/<int:pk>/status", PaymentStatusAPIView.as_view(), name="payment-status"),
 ]
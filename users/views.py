@@ -1,12 +1,20 @@
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions
 from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 
-from lms.models import Course
-from users.models import Payment, User
-from users.serializers import PaymentSerializer, UserSerializer
-from users.services import create_stripe_price, create_stripe_session, convert_rub_to_usd
+from lms.paginations import SelectablePagination, get_limit_param
+from users.exports import ExportMixin
+from users.models import Payment, PaymentSummary, User
+from users.serializers import PaymentSerializer, PaymentStatusSerializer, PaymentSummarySerializer, \
+    UserSerializer
+from users.services import fill_payment_session
+from users.tasks import create_payment_session
 
 
 class UserCreateAPIView(CreateAPIView):
@@ -24,24 +32,54 @@ class PaymentCreateAPIView(CreateAPIView):
     queryset = Payment.objects.all()
 
     def perform_create(self, serializer):
+        item = serializer.validated_data.get('course') or serializer.validated_data.get('lesson')
+        if item is None:
+            raise ValidationError('Укажите курс или урок для оплаты')
         payment = serializer.save(user=self.request.user)
 
-        amount_in_usd = convert_rub_to_usd(payment.amount)
+        if settings.PAYMENT_CREATE_ASYNC:
+            # ссылку заполнит задача, клиент опрашивает payment/<id>/status
+            transaction.on_commit(lambda: create_payment_session.delay(payment.pk))
+        else:
+            fill_payment_session(payment)
+
 
-        course = Course.objects.get(id=payment.course.id)
-        name = course.title
+class PaymentStatusAPIView(RetrieveAPIView):
+    """Статус платежа; пока ссылка не готова, Retry-After подсказывает, когда спросить снова.
 
-        price = create_stripe_price(amount_in_usd, name)
+    Сервер не ждет готовности сам: ожидание держало бы синхронный воркер.
+    """
+    serializer_class = PaymentStatusSerializer
 
-        session_id, payment_link = create_stripe_session(price)
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Payment.objects.none()
+        return Payment.objects.filter(user=self.request.user).only('id', 'status', 'link')
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.data['status'] == Payment.STATUS_PENDING:
+            response['Retry-After'] = str(settings.PAYMENT_STATUS_RETRY_AFTER)
+        return response
 
-        payment.session_id = session_id
-        payment.link = payment_link
-        payment.save()
 
 class UserListAPIView(ListAPIView):
     serializer_class = UserSerializer
     queryset = User.objects.all()
+    pagination_class = SelectablePagination
+    keyset_ordering = ('id',)
+
+    def get_queryset(self):
+        """Платежи всех пользователей страницы одним запросом."""
+        return super().get_queryset().prefetch_related(self.get_payments_prefetch())
+
+    def get_payments_prefetch(self):
+        """?payments_limit=N - только N последних платежей (оконная функция в том же запросе)."""
+        payments = Payment.objects.only(*UserSerializer.payment_fields).order_by('-payment_date', '-id')
+        limit = get_limit_param(self.request, 'payments_limit')
+        if limit is not None:
+            payments = payments[:limit]
+        return Prefetch('payments', queryset=payments, to_attr='prefetched_payments')
 
 class UserRetrieveAPIView(RetrieveAPIView):
     serializer_class = UserSerializer
@@ -64,4 +102,36 @@ class PaymentListAPIView(ListAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ("course", "lesson", "payment_method")
     ordering_fields = ('payment_date',)
-    ordering = ('-payment_date',)
\ No newline at end of file
+    ordering = ('-payment_date',)
+    pagination_class = SelectablePagination
+    keyset_ordering = ('-payment_date', '-id')
+
+
+class PaymentSummaryListAPIView(ListAPIView):
+    """Отчет по выручке из сводной таблицы, без чтения Payment"""
+    queryset = PaymentSummary.objects.all()
+    serializer_class = PaymentSummarySerializer
+    permission_classes = (IsAdminUser,)
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'day': ['gte', 'lte'],
+        'course_id': ['exact'],
+        'lesson_id': ['exact'],
+        'payment_method': ['exact'],
+    }
+    pagination_class = SelectablePagination
+    keyset_ordering = ('-day', '-id')
+
+
+class PaymentExportAPIView(ExportMixin, PaymentListAPIView):
+    """Выгрузка платежей с фильтрами списка платежей"""
+    permission_classes = (IsAdminUser,)
+    export_fields = ('id', 'user_id', 'payment_date', 'course_id', 'lesson_id', 'amount', 'payment_method', 'status')
+    export_name = 'payments'
+
+
+class UserExportAPIView(ExportMixin, UserListAPIView):
+    """Выгрузка пользователей"""
+    permission_classes = (IsAdminUser,)
+    export_fields = ('id', 'email', 'first_name', 'last_name', 'phone', 'city', 'is_active', 'date_joined')
+    export_name = 'users'